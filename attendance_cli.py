@@ -0,0 +1,317 @@
+"""Headless attendance: process a folder (or globs) of classroom photos without the GUI.
+
+    python attendance_cli.py photos/2026-10-17/ --section "BSCS 5A"
+    python attendance_cli.py "photos/*.jpg" --section "BSCS 5B" --batch-size 16
+
+Photos are decoded in parallel, detected in batches with one YOLO call per
+batch, and every face in a batch is embedded and matched together. All
+recognized students are marked present in one attendance session.
+
+With --workers N the photos are sharded across N processes that each load
+the models once and pull photos from a shared queue.
+
+Annotated images are encoded on a background thread. --image-format (jpg or
+webp), --image-quality and --image-max-side control the output;
+--image-format none or --no-images skips writing them.
+
+With --pipeline each photo flows through decode -> detect -> crop -> embed ->
+match threads joined by bounded queues, so the stages overlap across photos;
+per-stage latency and queue depth are printed at the end.
+
+With --stream the input is a camera index, stream URL or video file instead:
+
+    python attendance_cli.py 0 --stream --section "BSCS 5A" --duration 600
+    python attendance_cli.py rtsp://camera/live --stream --section "BSCS 5B" --sample-fps 1
+
+Frames are sampled at --sample-fps (dropped when recognition lags behind a
+live source) and students matched in at least --min-sightings sampled frames
+are marked present once, when the session ends. Faces are tracked across
+frames and only embedded when a track starts or is due for re-verification
+(--no-tracking embeds every face in every frame); only those fresh matches
+count as sightings.
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+
+from utils.face_utils import EMBED_BATCH_SIZE
+from utils.face_store import get_store, get_section_gallery
+from utils.recognition import process_photos, output_path_for
+from utils.image_writer import ImageWriter, IMAGE_FORMAT, IMAGE_FORMATS, IMAGE_MAX_SIDE
+from utils.pipeline import RecognitionPipeline, PIPELINE_QUEUE_SIZE
+from utils.stream import StreamSession, STREAM_SAMPLE_FPS, STREAM_MIN_SIGHTINGS
+from utils.recognition_pool import RecognitionPool, POOL_WORKERS
+from utils.csv_utils import mark_attendance
+from utils.metrics import metrics
+from utils.log_config import configure_logging, DIAGNOSTICS_ENABLED, DIAGNOSTICS_LOG
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+PHOTO_BATCH_SIZE = 8  # Photos per YOLO call
+
+logger = logging.getLogger("attendance_cli")
+
+
+def collect_images(inputs):
+    """Expand directories and glob patterns into a sorted, de-duplicated list of image paths"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item) or [item]
+        paths.extend(p for p in candidates
+                     if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(set(paths))
+
+
+def iter_in_process(paths, gallery, section, output_dir, batch_size, embed_batch_size, writer):
+    """Yield per-photo results from this process, batch by batch"""
+    for offset in range(0, len(paths), batch_size):
+        batch = paths[offset:offset + batch_size]
+        batch_start = time.perf_counter()
+        batch_results = process_photos(batch, gallery, section, output_dir, embed_batch_size, writer)
+        # Photos in a batch share the YOLO/FaceNet calls, so split the time evenly
+        per_photo = (time.perf_counter() - batch_start) / len(batch)
+        for result in batch_results:
+            result["seconds"] = per_photo
+            yield result
+
+
+def iter_pipelined(pipeline, paths, section, output_dir, writer):
+    """Yield per-photo results from the staged pipeline, queueing annotated images as they finish"""
+    last = time.perf_counter()
+    for job in pipeline.run({"path": path} for path in paths):
+        result = {"path": job["path"]}
+        if "error" in job:
+            result["error"] = job["error"]
+        else:
+            result["faces"] = len(job["boxes"])
+            result["present"] = job["present"]
+            result["output_path"] = None
+            if output_dir:
+                result["output_path"] = writer.submit(
+                    output_path_for(job["path"], section, output_dir), job["image"])
+        # Stages overlap, so report the time between finished photos
+        now = time.perf_counter()
+        result["seconds"] = now - last
+        last = now
+        yield result
+
+
+def run(paths, section, output_dir="attendance_images", batch_size=PHOTO_BATCH_SIZE,
+        embed_batch_size=EMBED_BATCH_SIZE, mark=True, workers=1, threads_per_worker=None,
+        pipeline=False, queue_size=PIPELINE_QUEUE_SIZE, fallback=True, image_options=None):
+    """Process all photos and mark one attendance session; returns (results, present, seconds)"""
+    if len(get_store()) == 0:
+        raise SystemExit("No students enrolled yet. Please enroll students first.")
+
+    image_options = image_options or {}
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    # Annotated images are encoded on a background thread while recognition continues
+    writer = ImageWriter(**image_options)
+
+    results = []
+    present_students = set()
+    start = time.perf_counter()
+    batch_size = max(1, batch_size)
+
+    pool = None
+    stages = None
+    if pipeline:
+        gallery = get_section_gallery(section, fallback=fallback)
+        stages = RecognitionPipeline(gallery, embed_batch_size, queue_size=queue_size)
+        stream = iter_pipelined(stages, paths, section, output_dir, writer)
+    elif workers > 1:
+        pool = RecognitionPool(section, workers=workers, threads_per_worker=threads_per_worker,
+                               output_dir=output_dir, embed_batch_size=embed_batch_size,
+                               photos_per_task=batch_size, fallback=fallback,
+                               image_options=image_options)
+        print(f"Started {pool.workers} workers x {pool.threads_per_worker} threads")
+        stream = pool.process(paths)
+    else:
+        gallery = get_section_gallery(section, fallback=fallback)
+        stream = iter_in_process(paths, gallery, section, output_dir,
+                                 batch_size, embed_batch_size, writer)
+
+    completed = False
+    try:
+        for result in stream:
+            present_students |= result.get("present", set())
+            if "error" in result:
+                print(f"  {result['path']}: {result['error']}")
+            else:
+                print(f"  {result['path']}: {result['faces']} faces, "
+                      f"{len(result['present'])} recognized, {result['seconds']:.2f}s")
+            results.append(result)
+        completed = True
+    finally:
+        if pool is not None:
+            # imap_unordered has already queued every photo; on an error or
+            # Ctrl+C don't wait for the rest to be processed
+            if completed:
+                pool.close()
+            else:
+                pool.terminate()
+        # Waits for the last queued images, so they count towards the elapsed time
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    if stages is not None:
+        print("\nPipeline stages:\n" + stages.format_stats())
+
+    # Results from every worker are merged into a single session; with no
+    # face detected anywhere there is nothing to record (not an all-absent session)
+    if mark and sum(r.get("faces", 0) for r in results):
+        mark_attendance(present_students, section)
+    return results, present_students, elapsed
+
+
+def run_stream(source, section, sample_fps=STREAM_SAMPLE_FPS, duration=None,
+               min_sightings=STREAM_MIN_SIGHTINGS, embed_batch_size=EMBED_BATCH_SIZE, mark=True,
+               tracking=True, fallback=True):
+    """Recognize from a live or recorded video and mark one attendance session at the end"""
+    if len(get_store()) == 0:
+        raise SystemExit("No students enrolled yet. Please enroll students first.")
+
+    gallery = get_section_gallery(section, fallback=fallback)
+    session = StreamSession(source, gallery, sample_fps=sample_fps, duration=duration,
+                            min_sightings=min_sightings, embed_batch_size=embed_batch_size,
+                            tracking=tracking)
+    try:
+        summary = session.run()
+    except KeyboardInterrupt:
+        # Ctrl+C ends the session early; what was seen so far still counts
+        summary = session.summary()
+        print("\nStopped.")
+
+    # A source that produced no frames says nothing about who attended
+    if mark and summary["frames_processed"]:
+        mark_attendance(summary["present"], section)
+    return summary
+
+
+def report_metrics(args):
+    # Stages run inside --workers processes are timed there and not collected here
+    if args.timings:
+        print("\nTimings:\n" + metrics.format_table())
+    if args.metrics_out:
+        print(f"Timings written to {metrics.dump(args.metrics_out)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mark attendance from a folder or glob of classroom photos.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("--section", required=True, help='Section to mark, e.g. "BSCS 5A"')
+    parser.add_argument("--output-dir", default="attendance_images",
+                        help="Where annotated images are written (default: attendance_images)")
+    parser.add_argument("--no-images", action="store_true", help="Don't write annotated images")
+    parser.add_argument("--batch-size", type=int, default=PHOTO_BATCH_SIZE,
+                        help=f"Photos per detection batch (default: {PHOTO_BATCH_SIZE})")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help=f"Faces per FaceNet call (default: {EMBED_BATCH_SIZE})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"Recognition processes, each loading its own models "
+                             f"(default: 1 = in-process; suggested: {POOL_WORKERS})")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Intra-op threads for TensorFlow/torch/OpenCV in each worker "
+                             "(default: CPU count / workers)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap decode/detect/crop/embed/match stages across photos "
+                             "in one process (ignores --workers and --batch-size)")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+                        help=f"Photos allowed to wait between pipeline stages "
+                             f"(default: {PIPELINE_QUEUE_SIZE})")
+    parser.add_argument("--stream", action="store_true",
+                        help="Treat the input as a camera index, stream URL or video file")
+    parser.add_argument("--sample-fps", type=float, default=STREAM_SAMPLE_FPS,
+                        help=f"Stream frames recognized per second (default: {STREAM_SAMPLE_FPS})")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stream session length in seconds (default: until the source ends)")
+    parser.add_argument("--min-sightings", type=int, default=STREAM_MIN_SIGHTINGS,
+                        help=f"Fresh face matches a student needs to be marked present "
+                             f"(default: {STREAM_MIN_SIGHTINGS})")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="Embed every face in every stream frame instead of once per track")
+    parser.add_argument("--roster-only", action="store_true",
+                        help="Only match students enrolled in --section (no fallback to everyone)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print per-stage timing histograms at the end")
+    parser.add_argument("--metrics-out", help="Write timing histograms and counters as JSON")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS, default=IMAGE_FORMAT,
+                        help=f"Annotated image format, or none to skip writing (default: {IMAGE_FORMAT})")
+    parser.add_argument("--image-quality", type=int,
+                        help="Encoder quality 0-100 (default: 90 for jpg, 80 for webp)")
+    parser.add_argument("--image-max-side", type=int, default=IMAGE_MAX_SIDE,
+                        help="Downscale annotated images so the longer side is at most this many pixels")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help=f"DEBUG logging mirrored to {DIAGNOSTICS_LOG} (or ATTENDANCE_DIAGNOSTICS=1)")
+    parser.add_argument("--dry-run", action="store_true", help="Recognize only; don't mark attendance")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.diagnostics or DIAGNOSTICS_ENABLED)
+
+    if args.stream:
+        if len(args.inputs) != 1:
+            parser.error("--stream takes exactly one source")
+        print(f"Streaming {args.inputs[0]} for {args.section} (Ctrl+C to end the session)...")
+        summary = run_stream(args.inputs[0], args.section, sample_fps=args.sample_fps,
+                             duration=args.duration, min_sightings=args.min_sightings,
+                             embed_batch_size=args.embed_batch_size, mark=not args.dry_run,
+                             tracking=not args.no_tracking, fallback=not args.roster_only)
+        print(f"\n{summary['frames_processed']} frames processed of {summary['frames_read']} read "
+              f"({summary['frames_dropped']} dropped), {summary['faces']} faces, "
+              f"{summary['embedded']} embedded, {summary['fps']:.2f} fps sustained")
+        present = summary["present"]
+        print(f"Present ({len(present)}): {', '.join(sorted(present)) or 'none'}")
+        if summary["frames_processed"] == 0:
+            print("No frames read from the source - attendance not marked.", file=sys.stderr)
+            report_metrics(args)
+            return 1
+        print("Dry run - attendance not marked." if args.dry_run
+              else f"Attendance marked for {args.section}.")
+        report_metrics(args)
+        return 0
+
+    paths = collect_images(args.inputs)
+    if not paths:
+        print("No images found.", file=sys.stderr)
+        return 1
+
+    print(f"Processing {len(paths)} photos for {args.section}...")
+    results, present, elapsed = run(
+        paths, args.section,
+        output_dir=None if args.no_images else args.output_dir,
+        batch_size=args.batch_size,
+        embed_batch_size=args.embed_batch_size,
+        mark=not args.dry_run,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        pipeline=args.pipeline,
+        queue_size=args.queue_size,
+        fallback=not args.roster_only,
+        image_options={"fmt": args.image_format, "quality": args.image_quality,
+                       "max_side": args.image_max_side})
+
+    total_faces = sum(r.get("faces", 0) for r in results)
+    print(f"\n{len(paths)} photos, {total_faces} faces in {elapsed:.2f}s "
+          f"({len(paths) / elapsed:.2f} photos/s, {total_faces / elapsed:.1f} faces/s)")
+    print(f"Present ({len(present)}): {', '.join(sorted(present)) or 'none'}")
+    if total_faces == 0:
+        print("No faces detected in any photo - attendance not marked.", file=sys.stderr)
+        report_metrics(args)
+        return 1
+    if args.dry_run:
+        print("Dry run - attendance not marked.")
+    else:
+        print(f"Attendance marked for {args.section}.")
+    report_metrics(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""Time every csv_utils query on synthetic attendance data of increasing size.
+
+For each scale an attendance store with that many students, sections and
+days of sessions is generated in a temporary directory, and every public
+csv_utils function is timed twice: "cold" right after the store changed
+(so the index is reparsed) and "warm" against the cached index. Appending
+(mark_attendance, add_student_column) is timed last since it changes the data.
+
+    python benchmarks/analytics.py --output analytics.json --plot analytics.png
+    python benchmarks/analytics.py --scales 200x10x90 2000x100x365
+
+The scaling exponent between consecutive scales (log time / log cells, where
+cells = students x sessions) is printed for each function; values well above
+1 mark paths that grow superlinearly with the data.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import csv_utils  # noqa: E402
+from utils.attendance_store import STUDENTS_PATH, SESSIONS_PATH  # noqa: E402
+
+# students x sections x days
+DEFAULT_SCALES = ("500x20x180", "2000x100x365", "5000x200x730")
+SECTIONS_PER_DAY = 0.2  # Share of sections holding a session on a given day
+PRESENT_RATE = 0.85
+REPEATS = 5
+
+
+def parse_scale(text):
+    students, sections, days = (int(part) for part in text.lower().split("x"))
+    return {"students": students, "sections": sections, "days": days}
+
+
+def generate(scale, seed=0):
+    """Write students.csv and sessions.csv for one scale under the current directory"""
+    rng = np.random.default_rng(seed)
+    n_students, n_sections, days = scale["students"], scale["sections"], scale["days"]
+    students = [f"Student {i:05d} ({100000 + i})" for i in range(n_students)]
+    section_of = rng.integers(n_sections, size=n_students)
+    # Per-student attendance probability, with a tail of low attenders
+    rate = np.clip(rng.normal(PRESENT_RATE, 0.12, size=n_students), 0.05, 1.0)
+    members = [np.flatnonzero(section_of == s) for s in range(n_sections)]
+
+    os.makedirs(os.path.dirname(STUDENTS_PATH) or ".", exist_ok=True)
+    with open(STUDENTS_PATH, "w", newline="") as f:
+        f.write("Student\n")
+        f.writelines(f"{name}\n" for name in students)
+
+    sessions = 0
+    start = date.today() - timedelta(days=days - 1)
+    with open(SESSIONS_PATH, "w", newline="") as f:
+        f.write("Date,Section,Present\n")
+        for d in range(days):
+            day = str(start + timedelta(days=d))
+            meeting = rng.random(n_sections) < SECTIONS_PER_DAY
+            for s in np.flatnonzero(meeting):
+                bits = np.zeros(n_students, dtype=np.uint8)
+                roster = members[s]
+                bits[roster] = rng.random(len(roster)) < rate[roster]
+                mask = int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+                f.write(f"{day},Section {s},{format(mask, 'x')}\n")
+                sessions += 1
+    return students, sessions
+
+
+def reset_cache():
+    csv_utils._index_cache.update({"signature": None, "index": None})
+
+
+def time_call(func, args, repeats, cold):
+    samples = []
+    for _ in range(repeats):
+        if cold:
+            reset_cache()
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    ms = np.array(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(ms, 50)), "max_ms": float(ms.max())}
+
+
+def queries(students, export_path):
+    today = date.today()
+    return {
+        "get_attendance_index": (csv_utils.get_attendance_index, ()),
+        "get_attendance_data": (csv_utils.get_attendance_data, ()),
+        "get_students_list": (csv_utils.get_students_list, ()),
+        "get_attendance_by_section": (csv_utils.get_attendance_by_section, ("Section 1",)),
+        "get_attendance_by_date_range": (csv_utils.get_attendance_by_date_range,
+                                         (today - timedelta(days=30), today, "All")),
+        "get_student_attendance_rate": (csv_utils.get_student_attendance_rate, (students[0],)),
+        "get_attendance_summary": (csv_utils.get_attendance_summary, ()),
+        "get_all_student_attendance_rates": (csv_utils.get_all_student_attendance_rates, ()),
+        "get_low_attendance_students": (csv_utils.get_low_attendance_students, ()),
+        "get_daily_attendance_counts": (csv_utils.get_daily_attendance_counts, (7,)),
+        "get_daily_attendance_counts_30d_section": (csv_utils.get_daily_attendance_counts,
+                                                    (30, "Section 1")),
+        "get_section_comparison": (csv_utils.get_section_comparison, ()),
+        "get_today_attendance_by_section": (csv_utils.get_today_attendance_by_section, ()),
+        "get_recent_activities": (csv_utils.get_recent_activities, ()),
+        "search_students": (csv_utils.search_students, ("00042",)),
+        "export_attendance_csv": (csv_utils.export_attendance_csv, (export_path,)),
+    }
+
+
+def bench_scale(scale, repeats):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            reset_cache()
+            gen_start = time.perf_counter()
+            students, sessions = generate(scale)
+            result = dict(scale, sessions=sessions, cells=len(students) * sessions,
+                          generate_seconds=time.perf_counter() - gen_start,
+                          sessions_file_mb=os.path.getsize(SESSIONS_PATH) / 1e6,
+                          functions={})
+
+            for name, (func, args) in queries(students, "export.csv").items():
+                result["functions"][name] = {
+                    "cold": time_call(func, args, repeats, cold=True),
+                    "warm": time_call(func, args, repeats, cold=False),
+                }
+
+            # Writes: each one changes the store, so the next query pays a reparse
+            writes = {
+                "mark_attendance": lambda i: csv_utils.mark_attendance(
+                    set(students[i::97]), "Section 1"),
+                "add_student_column": lambda i: csv_utils.add_student_column(f"New Student {i}"),
+            }
+            for name, write in writes.items():
+                append, refresh = [], []
+                for i in range(repeats):
+                    start = time.perf_counter()
+                    write(i)
+                    append.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    csv_utils.get_attendance_summary()
+                    refresh.append(time.perf_counter() - start)
+                result["functions"][name] = {
+                    "append": {"p50_ms": float(np.percentile(append, 50) * 1000)},
+                    "next_query": {"p50_ms": float(np.percentile(refresh, 50) * 1000)},
+                }
+        finally:
+            os.chdir(cwd)
+            reset_cache()
+    return result
+
+
+def scaling_exponents(results):
+    """log(time ratio) / log(cells ratio) between consecutive scales, per function and mode"""
+    exponents = {}
+    for prev, cur in zip(results, results[1:]):
+        cells = cur["cells"] / prev["cells"]
+        if cells <= 1:
+            continue
+        for name, modes in cur["functions"].items():
+            for mode, stats in modes.items():
+                before = prev["functions"][name][mode]["p50_ms"]
+                if before > 0 and stats["p50_ms"] > 0:
+                    exponents.setdefault(name, {}).setdefault(mode, []).append(
+                        math.log(stats["p50_ms"] / before) / math.log(cells))
+    return exponents
+
+
+def plot(results, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not installed; skipping plot")
+        return
+
+    cells = [r["cells"] for r in results]
+    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+    for ax, mode in zip(axes, ("cold", "warm")):
+        for name in results[0]["functions"]:
+            if mode not in results[0]["functions"][name]:
+                continue
+            ax.plot(cells, [r["functions"][name][mode]["p50_ms"] for r in results],
+                    marker="o", label=name)
+        # Reference slope: linear in students x sessions, anchored on the first index parse
+        base = results[0]["functions"]["get_attendance_index"]["cold"]["p50_ms"]
+        ax.plot(cells, [base * c / cells[0] for c in cells], "k--", linewidth=1, label="linear")
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("students x sessions")
+        ax.set_ylabel("p50 ms")
+        ax.set_title(f"{mode} index")
+    axes[1].legend(fontsize=7, loc="upper left")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    print(f"Plot written to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", default=list(DEFAULT_SCALES),
+                        help="STUDENTSxSECTIONSxDAYS, smallest first")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--plot", help="Write a log-log scaling plot (PNG) to this file")
+    args = parser.parse_args()
+
+    results = []
+    for text in args.scales:
+        scale = parse_scale(text)
+        result = bench_scale(scale, args.repeats)
+        results.append(result)
+        print(f"\n{scale['students']} students, {scale['sections']} sections, "
+              f"{result['sessions']} sessions ({result['sessions_file_mb']:.1f} MB):")
+        for name, modes in result["functions"].items():
+            timings = ", ".join(f"{mode} {stats['p50_ms']:.2f}ms" for mode, stats in modes.items())
+            print(f"  {name:>40}: {timings}")
+
+    exponents = scaling_exponents(results)
+    if exponents:
+        print("\nScaling exponent vs students x sessions (1 = linear):")
+        for name, modes in exponents.items():
+            line = ", ".join(f"{mode} {max(values):.2f}" for mode, values in modes.items())
+            flag = "  <- superlinear" if any(max(v) > 1.2 for v in modes.values()) else ""
+            print(f"  {name:>40}: {line}{flag}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"scales": results, "scaling_exponents": exponents}, f, indent=2)
+    if args.plot:
+        plot(results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Time each recognition stage on synthetic classroom photos built from dataset/.
+
+Every scene is a grid collage of the enrollment photos in dataset/, so it
+holds a known number of faces (10, 50 and 200 by default). For each scene the
+decode, YOLO, crop, FaceNet and matching stages are timed separately, then the
+end-to-end process_photos path, the single-image extract_embedding and the
+per-face recognize_face call.
+
+    python benchmarks/recognition.py --repeats 5 --output recognition.json
+    python benchmarks/recognition.py --baseline recognition.json
+
+Results include the git commit so runs from different commits can be
+compared; --baseline prints the p50 change against an earlier JSON file.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.face_utils import (  # noqa: E402
+    FaceGallery, load_models, detect_faces, crop_faces, embed_faces,
+    extract_embedding, recognize_face, EMBED_BATCH_SIZE
+)
+from utils.recognition import process_photos  # noqa: E402
+
+SCENE_SIZES = (10, 50, 200)
+TILE_SIZE = (160, 200)  # (width, height) of each face photo in a collage
+GALLERY_SIZE = 500  # Synthetic identities when the face store is empty
+
+
+def load_faces(dataset_dir):
+    paths = sorted(p for p in glob.glob(os.path.join(dataset_dir, "*", "*"))
+                   if p.lower().endswith((".jpg", ".jpeg", ".png")))
+    images = [cv2.imread(p) for p in paths]
+    images = [cv2.resize(img, TILE_SIZE) for img in images if img is not None]
+    if not images:
+        raise SystemExit(f"No images found under {dataset_dir}")
+    return images
+
+
+def make_collage(faces, count, seed=0):
+    """Grid of count face photos, drawn round-robin from faces with a per-tile jitter"""
+    rng = np.random.default_rng(seed)
+    cols = math.ceil(math.sqrt(count * 16 / 9))
+    rows = math.ceil(count / cols)
+    w, h = TILE_SIZE
+    canvas = np.full((rows * h, cols * w, 3), 40, dtype=np.uint8)
+    for i in range(count):
+        tile = faces[i % len(faces)]
+        # Small brightness changes so repeated photos are not identical
+        tile = cv2.convertScaleAbs(tile, alpha=1.0, beta=int(rng.integers(-20, 21)))
+        r, c = divmod(i, cols)
+        canvas[r * h:(r + 1) * h, c * w:(c + 1) * w] = tile
+    return canvas
+
+
+def make_gallery(size, seed=0):
+    """The enrolled gallery, or random unit-length identities when nothing is enrolled"""
+    from utils.face_store import get_gallery
+    gallery = get_gallery()
+    if len(gallery):
+        return gallery, "face_store"
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(size, 512)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return FaceGallery([f"student_{i}" for i in range(size)], matrix, np.arange(size)), "synthetic"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "mean_ms": float(ms.mean()), "runs": len(samples)}
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_scene(collage, expected_faces, gallery, repeats, batch_size, tmp_dir):
+    path = os.path.join(tmp_dir, f"scene_{expected_faces}.jpg")
+    cv2.imwrite(path, collage)
+
+    stages = {name: [] for name in ("decode", "detect", "crop", "embed", "match",
+                                    "end_to_end", "recognize_face_per_face")}
+    detected = 0
+    for _ in range(repeats):
+        img, t = timed(cv2.imread, path)
+        stages["decode"].append(t)
+        boxes, t = timed(detect_faces, [img])
+        stages["detect"].append(t)
+        boxes = boxes[0]
+        detected = len(boxes)
+        (faces, _), t = timed(crop_faces, img, boxes)
+        stages["crop"].append(t)
+        embeddings, t = timed(embed_faces, faces, batch_size)
+        stages["embed"].append(t)
+        if len(embeddings):
+            _, t = timed(gallery.match, embeddings)
+            stages["match"].append(t)
+            # The per-face API the GUI used before batching, for comparison
+            _, t = timed(recognize_face, embeddings[0], gallery)
+            stages["recognize_face_per_face"].append(t)
+        _, t = timed(process_photos, [path], gallery, "Benchmark", None, batch_size)
+        stages["end_to_end"].append(t)
+
+    result = {name: percentiles(samples) for name, samples in stages.items() if samples}
+    end_to_end_p50 = result["end_to_end"]["p50_ms"] / 1000.0
+    result.update({
+        "faces_in_scene": expected_faces,
+        "faces_detected": detected,
+        "image_shape": list(collage.shape),
+        "faces_per_second": detected / end_to_end_p50 if end_to_end_p50 > 0 else None,
+    })
+    return result
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')}):")
+    for size, scene in results["scenes"].items():
+        old = baseline.get("scenes", {}).get(size)
+        if not old:
+            continue
+        for stage, stats in scene.items():
+            if isinstance(stats, dict) and stage in old:
+                before, after = old[stage]["p50_ms"], stats["p50_ms"]
+                change = (after - before) / before * 100 if before else 0.0
+                print(f"  {size:>4} faces {stage:>24}: {before:8.1f} -> {after:8.1f} ms ({change:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default=os.path.join(ROOT, "dataset"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SCENE_SIZES),
+                        help="Faces per synthetic scene")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--gallery-size", type=int, default=GALLERY_SIZE,
+                        help="Synthetic identities if no students are enrolled")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier JSON output to compare against")
+    args = parser.parse_args()
+
+    faces = load_faces(args.dataset)
+    gallery, gallery_source = make_gallery(args.gallery_size)
+
+    _, load_seconds = timed(load_models)
+    # One untimed pass so lazy graph building isn't charged to the first scene
+    warm = make_collage(faces, 1)
+    embed_faces(crop_faces(warm, detect_faces([warm])[0])[0], args.embed_batch_size)
+
+    single = []
+    for img in faces[:args.repeats]:
+        _, t = timed(extract_embedding, img)
+        single.append(t)
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "gallery": {"source": gallery_source, "identities": len(gallery),
+                    "rows": int(len(gallery.matrix))},
+        "embed_batch_size": args.embed_batch_size,
+        "model_load_seconds": load_seconds,
+        "extract_embedding_single": percentiles(single),
+        "scenes": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            collage = make_collage(faces, size, seed=size)
+            scene = bench_scene(collage, size, gallery, args.repeats, args.embed_batch_size, tmp_dir)
+            results["scenes"][str(size)] = scene
+            print(f"{size:>4} faces ({scene['faces_detected']} detected): "
+                  f"detect p50 {scene['detect']['p50_ms']:.1f}ms, "
+                  f"embed p50 {scene['embed']['p50_ms']:.1f}ms, "
+                  f"end-to-end p50 {scene['end_to_end']['p50_ms']:.1f}ms "
+                  f"p95 {scene['end_to_end']['p95_ms']:.1f}ms, "
+                  f"{scene['faces_per_second'] or 0:.1f} faces/s")
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(f"model load {load_seconds:.2f}s, "
+          f"extract_embedding p50 {results['extract_embedding_single']['p50_ms']:.1f}ms, "
+          f"peak RSS {results['peak_rss_mb'] or 0:.0f} MB")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
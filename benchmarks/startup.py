@@ -0,0 +1,86 @@
+"""Measure how long the main window takes to appear, with lazy vs. eager model loading.
+
+Each run happens in a fresh interpreter so import caches don't leak between
+runs. "lazy" is the current startup path; "eager" also loads YOLO and FaceNet
+before building the window, which is what every launch used to pay.
+
+    python benchmarks/startup.py --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["tensorflow", "keras_facenet", "ultralytics", "torch"]
+
+RUN_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+from gui.main_window import MainWindow
+imported = time.perf_counter()
+if {eager}:
+    from utils.face_utils import load_models
+    load_models()
+app = QApplication(sys.argv)
+window = MainWindow()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "window_seconds": shown - start,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(eager):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    code = RUN_SNIPPET.format(eager=eager, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(mode, runs):
+    samples = [run_once(mode == "eager") for _ in range(runs)]
+    window = [s["window_seconds"] for s in samples]
+    return {
+        "runs": runs,
+        "import_seconds_median": statistics.median(s["import_seconds"] for s in samples),
+        "window_seconds_median": statistics.median(window),
+        "window_seconds_min": min(window),
+        "heavy_modules": samples[-1]["heavy_modules"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args.runs) for mode in ("lazy", "eager")}
+    results["speedup"] = (results["eager"]["window_seconds_median"] /
+                          results["lazy"]["window_seconds_median"])
+
+    for mode in ("lazy", "eager"):
+        r = results[mode]
+        print(f"{mode:>5}: window shown in {r['window_seconds_median']:.2f}s "
+              f"(imports {r['import_seconds_median']:.2f}s), "
+              f"heavy modules loaded: {', '.join(r['heavy_modules']) or 'none'}")
+    print(f"speedup: {results['speedup']:.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
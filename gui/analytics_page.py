@@ -19,7 +19,7 @@ from utils.csv_utils import (
     get_all_student_attendance_rates,
     get_daily_attendance_counts,
     get_section_comparison,
-    get_attendance_data
+    get_attendance_totals
 )
 
 
@@ -271,21 +271,8 @@ class AnalyticsPage(QWidget):
             if item.widget():
                 item.widget().deleteLater()
 
-        header, data = get_attendance_data()
-        if not data:
-            no_data = QLabel("No attendance data available")
-            no_data.setAlignment(Qt.AlignCenter)
-            no_data.setStyleSheet("font-size: 14px; color: #95A5A6; background: transparent;")
-            layout.addWidget(no_data)
-            return
-
-        total_present = 0
-        total_absent = 0
-
-        for row in data:
-            if len(row) > 2:
-                total_present += row[2:].count("P")
-                total_absent += row[2:].count("A")
+        # Counted from the presence bits; no wide P/A rows are built
+        total_present, total_absent = get_attendance_totals()
 
         if total_present + total_absent == 0:
             no_data = QLabel("No attendance data available")
@@ -1,8 +1,5 @@
-import os
 import cv2
-import pickle
 import logging
-from datetime import date
 
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
@@ -11,18 +8,15 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage
 
-from utils.face_utils import recognize_face, preprocess_face, THRESHOLD
-from utils.csv_utils import mark_attendance
-
-# Setup logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('attendance_debug.log', mode='w')
-    ]
-)
+from utils.face_utils import EMBED_BATCH_SIZE
+from utils.metrics import metrics, METRICS_FILE
+from utils.log_config import configure_logging
+from utils.image_writer import downscale
+from gui.workers import RecognitionWorker
+
+# INFO by default; ATTENDANCE_DIAGNOSTICS=1 adds DEBUG records and attendance_debug.log
+configure_logging()
+
 logger = logging.getLogger(__name__)
 
 
@@ -69,27 +63,6 @@ def styled_message(parent, title, message, msg_type="info"):
     msg.exec_()
 
 
-# Lazy load heavy models
-_yolo_model = None
-_facenet_model = None
-
-
-def get_yolo():
-    global _yolo_model
-    if _yolo_model is None:
-        from ultralytics import YOLO
-        _yolo_model = YOLO("model.pt")
-    return _yolo_model
-
-
-def get_facenet():
-    global _facenet_model
-    if _facenet_model is None:
-        from keras_facenet import FaceNet
-        _facenet_model = FaceNet()
-    return _facenet_model
-
-
 class AttendancePage(QWidget):
     # Signal to notify when to go back to dashboard
     go_back = pyqtSignal()
@@ -98,11 +71,12 @@ class AttendancePage(QWidget):
         super().__init__(parent)
         self.setStyleSheet("background: transparent;")
         self.current_section = "Unknown"  # Default section
-        # Use the SAME models from face_utils to ensure consistent embeddings!
-        # This is critical - enrollment uses face_utils.embedder, so we must too
-        from utils.face_utils import yolo, embedder
-        self.yolo = yolo
-        self.embedder = embedder
+        # Models come from face_utils' shared registry (same ones enrollment uses)
+        # and are only loaded when the first photo is processed
+        self.embed_batch_size = EMBED_BATCH_SIZE  # Faces per FaceNet call
+        self.worker = None
+        # A cancelled run left behind by reset_form; Select stays off until its thread ends
+        self.stopping_worker = None
         self.setup_ui()
 
     def set_section(self, section):
@@ -121,6 +95,16 @@ class AttendancePage(QWidget):
             }
         """)
 
+    def set_models_status(self, ready, text=None):
+        """Show whether the recognition models are loaded and warmed up"""
+        if text is None:
+            text = "✅ Recognition models ready" if ready else "⏳ Loading recognition models..."
+        color = "#27AE60" if ready else "#E67E22"
+        self.model_status_label.setText(text)
+        self.model_status_label.setStyleSheet(
+            f"font-size: 12px; color: {color}; background: transparent; font-family: 'Segoe UI', Arial, sans-serif;")
+        self.model_status_label.setVisible(True)
+
     def setup_ui(self):
         main_layout = QVBoxLayout()
         main_layout.setContentsMargins(0, 0, 0, 0)
@@ -259,10 +243,17 @@ class AttendancePage(QWidget):
             }
         """)
 
+        # Model readiness (filled in by MainWindow's warm-up worker)
+        self.model_status_label = QLabel("")
+        self.model_status_label.setAlignment(Qt.AlignCenter)
+        self.model_status_label.setWordWrap(True)
+        self.model_status_label.setVisible(False)
+
         layout.addWidget(icon_label)
         layout.addWidget(title)
         layout.addWidget(subtitle)
         layout.addWidget(self.section_label)
+        layout.addWidget(self.model_status_label)
         layout.addSpacing(20)
 
         self.select_btn = QPushButton("📁  Select Classroom Image")
@@ -289,6 +280,31 @@ class AttendancePage(QWidget):
 
         layout.addWidget(self.select_btn)
 
+        self.cancel_btn = QPushButton("✖  Cancel")
+        self.cancel_btn.setFixedHeight(40)
+        self.cancel_btn.setStyleSheet("""
+            QPushButton {
+                background: #E74C3C;
+                color: white;
+                border: none;
+                border-radius: 10px;
+                font-size: 14px;
+                font-weight: bold;
+                font-family: 'Segoe UI', Arial, sans-serif;
+            }
+            QPushButton:hover {
+                background: #C0392B;
+            }
+            QPushButton:disabled {
+                background: #BDC3C7;
+                color: #7F8C8D;
+            }
+        """)
+        self.cancel_btn.clicked.connect(self.cancel_attendance)
+        self.cancel_btn.setVisible(False)
+
+        layout.addWidget(self.cancel_btn)
+
         # Progress
         self.progress_bar = QProgressBar()
         self.progress_bar.setStyleSheet("""
@@ -345,6 +361,43 @@ class AttendancePage(QWidget):
         self.results_frame.setLayout(results_layout)
         layout.addWidget(self.results_frame)
 
+        # Timing details: per-stage histograms collected by utils.metrics
+        timings_row = QHBoxLayout()
+        self.timings_btn = QPushButton("⏱  Show Timings")
+        self.timings_btn.setCheckable(True)
+        self.timings_btn.setFixedHeight(34)
+        self.timings_btn.setStyleSheet("""
+            QPushButton {
+                background: #ECF0F1;
+                color: #2C3E50;
+                border: none;
+                border-radius: 8px;
+                font-size: 13px;
+                font-family: 'Segoe UI', Arial, sans-serif;
+            }
+            QPushButton:hover, QPushButton:checked {
+                background: #D5DBDB;
+            }
+        """)
+        self.timings_btn.toggled.connect(self.toggle_timings)
+
+        self.save_timings_btn = QPushButton("💾  Save")
+        self.save_timings_btn.setFixedHeight(34)
+        self.save_timings_btn.setStyleSheet(self.timings_btn.styleSheet())
+        self.save_timings_btn.clicked.connect(self.save_timings)
+        self.save_timings_btn.setVisible(False)
+
+        timings_row.addWidget(self.timings_btn, 1)
+        timings_row.addWidget(self.save_timings_btn)
+        layout.addLayout(timings_row)
+
+        self.timings_label = QLabel("")
+        self.timings_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.timings_label.setStyleSheet(
+            "font-size: 11px; color: #2C3E50; background: #F8F9FA; border-radius: 8px; padding: 10px; font-family: Consolas, 'Courier New', monospace;")
+        self.timings_label.setVisible(False)
+        layout.addWidget(self.timings_label)
+
         panel.setLayout(layout)
         return panel
 
@@ -376,11 +429,18 @@ class AttendancePage(QWidget):
 
     def reset_form(self):
         """Reset all form fields"""
+        if self.worker is not None:
+            # The old run may still be saving under its own section; its
+            # remaining signals are ignored
+            self.cancel_attendance()
+            self.stopping_worker = self.worker
+            self.worker = None
+        self.cancel_btn.setVisible(False)
         self.progress_bar.setVisible(False)
         self.progress_bar.setValue(0)
         self.status_label.setText("")
         self.results_frame.setVisible(False)
-        self.select_btn.setEnabled(True)
+        self.select_btn.setEnabled(self.stopping_worker is None)
         self.select_btn.setText("📁  Select Classroom Image")
         self.preview_label.setText(
             "Select an image to see preview here\n\nProcessed image with detected faces will be displayed")
@@ -388,6 +448,8 @@ class AttendancePage(QWidget):
             "font-size: 16px; color: #95A5A6; background: #F8F9FA; border-radius: 10px; padding: 100px; font-family: 'Segoe UI', Arial, sans-serif;")
 
     def process_attendance(self):
+        if self.worker is not None or self.stopping_worker is not None:
+            return
         img_path, _ = QFileDialog.getOpenFileName(
             self, "Select Classroom Image", "", "Images (*.jpg *.png *.jpeg)"
         )
@@ -396,189 +458,116 @@ class AttendancePage(QWidget):
 
         self.results_frame.setVisible(False)
         self.select_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.setVisible(True)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.status_label.setText("Loading face database...")
 
-        from PyQt5.QtWidgets import QApplication
-        QApplication.processEvents()
-
-        try:
-            with open("face_db.pkl", "rb") as f:
-                face_db = pickle.load(f)
-            logger.info("=" * 60)
-            logger.info("FACE DATABASE LOADED")
-            logger.info(f"Number of enrolled students: {len(face_db)}")
-            for name, embeddings in face_db.items():
-                logger.info(f"  - {name}: {len(embeddings)} embedding(s)")
-                if embeddings:
-                    logger.debug(f"    Embedding shape: {embeddings[0].shape}")
-                    logger.debug(
-                        f"    Embedding sample: {embeddings[0][:5]}...")
-            logger.info("=" * 60)
-        except FileNotFoundError:
-            logger.error("face_db.pkl not found!")
-            self.progress_bar.setVisible(False)
-            self.status_label.setText("")
-            self.select_btn.setEnabled(True)
-            styled_message(
-                self, "Error", "No students enrolled yet. Please enroll students first.", "warning")
+        # Heavy lifting happens in RecognitionWorker so the window stays responsive
+        self.worker = RecognitionWorker(
+            img_path, self.current_section, self.embed_batch_size, self)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.face_recognized.connect(self.on_face_recognized)
+        self.worker.completed.connect(self.on_attendance_completed)
+        self.worker.failed.connect(self.on_attendance_failed)
+        self.worker.cancelled.connect(self.on_attendance_cancelled)
+        self.worker.finished.connect(self.on_worker_finished)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.worker.start()
+
+    def cancel_attendance(self):
+        """Stop the running recognition; nothing is saved"""
+        if self.worker is not None and self.worker.isRunning():
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+            self.worker.cancel()
+
+    def finish_run(self):
+        # Select comes back in on_worker_finished, once the thread has really ended
+        self.cancel_btn.setVisible(False)
+        self.refresh_timings()
+
+    def on_worker_finished(self):
+        worker = self.sender()
+        if worker is self.worker:
+            self.worker = None
+        elif worker is self.stopping_worker:
+            self.stopping_worker = None
+        else:
             return
+        if self.worker is None and self.stopping_worker is None:
+            self.select_btn.setEnabled(True)
 
-        self.progress_bar.setValue(20)
-        self.status_label.setText("Reading image...")
-        QApplication.processEvents()
-
-        img = cv2.imread(img_path)
-        logger.info(f"Image loaded: {img_path}, shape: {img.shape}")
-        present_students = set()
-
-        self.progress_bar.setValue(40)
-        self.status_label.setText("Detecting faces...")
-        QApplication.processEvents()
-
-        # Run YOLO detection (exactly like old code)
-        logger.info(f"Running YOLO detection with model: {self.yolo}")
-        logger.info(f"Embedder being used: {self.embedder}")
+    def toggle_timings(self, shown):
+        self.timings_btn.setText("⏱  Hide Timings" if shown else "⏱  Show Timings")
+        self.timings_label.setVisible(shown)
+        self.save_timings_btn.setVisible(shown)
+        self.refresh_timings()
 
-        # Check if we're using the same embedder as face_utils
-        from utils.face_utils import embedder as face_utils_embedder
-        logger.info(f"Attendance embedder ID: {id(self.embedder)}")
-        logger.info(f"face_utils embedder ID: {id(face_utils_embedder)}")
-        logger.info(f"Same embedder? {self.embedder is face_utils_embedder}")
-        results = self.yolo(img, verbose=False)
+    def refresh_timings(self):
+        if self.timings_btn.isChecked():
+            self.timings_label.setText(metrics.format_table())
 
-        self.progress_bar.setValue(50)
+    def save_timings(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save Timings", METRICS_FILE, "JSON Files (*.json)")
+        if not path:
+            return
+        try:
+            metrics.dump(path)
+        except OSError as e:
+            styled_message(self, "Error", f"Could not save timings:\n{e}", "error")
+            return
+        styled_message(self, "Timings Saved", f"Timings saved to:\n{path}", "info")
 
-        # Count faces first to check if any detected
-        total_faces = sum(
-            len(r.boxes) if r.boxes is not None else 0 for r in results)
-        logger.info(f"YOLO detected {total_faces} faces")
+    def on_progress(self, value, text):
+        # Signals from a worker this page no longer tracks are stale
+        if self.sender() is not self.worker:
+            return
+        self.progress_bar.setValue(value)
+        self.status_label.setText(text)
 
-        if total_faces == 0:
-            self.progress_bar.setVisible(False)
-            self.status_label.setText("")
-            self.select_btn.setEnabled(True)
-            styled_message(
-                self, "Error", "No faces detected in the image. Please try a different image.", "warning")
+    def on_face_recognized(self, face_index, name, dist):
+        if self.sender() is not self.worker:
             return
+        self.status_label.setText(f"Face {face_index}: {name} ({dist:.2f})")
 
-        self.status_label.setText(
-            f"Processing {total_faces} detected faces...")
-        QApplication.processEvents()
-
-        # Process faces exactly like old code
-        recognized_count = 0
-        face_index = 0
-        logger.info(f"Recognition THRESHOLD: {THRESHOLD}")
-        logger.info("-" * 60)
-
-        for r in results:
-            if r.boxes is None:
-                continue
-
-            for box in r.boxes:
-                face_index += 1
-                try:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    logger.debug(
-                        f"Face {face_index}: bbox=({x1},{y1},{x2},{y2})")
-
-                    face = img[y1:y2, x1:x2]
-                    if face.size == 0:
-                        logger.warning(
-                            f"Face {face_index}: Empty face region, skipping")
-                        continue
-
-                    # Process face exactly like old code
-                    face = preprocess_face(face)
-                    logger.debug(
-                        f"Face {face_index}: Preprocessed shape: {face.shape}")
-
-                    emb = self.embedder.embeddings([face])[0]
-                    logger.debug(
-                        f"Face {face_index}: Embedding shape: {emb.shape}")
-                    logger.debug(
-                        f"Face {face_index}: Embedding sample: {emb[:5]}...")
-
-                    # Use verbose mode for first 3 faces to see all distances
-                    verbose = (face_index <= 3)
-                    if verbose:
-                        logger.info(f"Face {face_index}: Detailed comparison:")
-                    name, dist = recognize_face(emb, face_db, verbose=verbose)
-                    logger.info(
-                        f"Face {face_index}: RESULT -> name='{name}', distance={dist:.4f}, threshold={THRESHOLD}")
-
-                    if name != "Unknown":
-                        present_students.add(name)
-                        recognized_count += 1
-                        logger.info(
-                            f"Face {face_index}: ✓ RECOGNIZED as '{name}'")
-                    else:
-                        logger.info(
-                            f"Face {face_index}: ✗ Unknown (distance {dist:.4f} > threshold {THRESHOLD})")
-
-                    label = f"{name} ({dist:.2f})"
-                    color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-                    cv2.rectangle(img, (x1, y1), (x2, y2), color, 3)
-                    cv2.putText(img, label, (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                except Exception as e:
-                    # Log error but continue processing
-                    logger.error(f"Face {face_index}: Error processing - {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    continue
-
-        logger.info("-" * 60)
-        logger.info(
-            f"FINAL RESULTS: {recognized_count} recognized out of {total_faces} faces")
-        logger.info(f"Present students: {present_students}")
-        logger.info("=" * 60)
-
-        # Update progress after processing all faces
-        self.progress_bar.setValue(90)
-        QApplication.processEvents()
-
-        self.progress_bar.setValue(95)
-        self.status_label.setText("Saving attendance records...")
-        QApplication.processEvents()
-
-        # Try to mark attendance with section and error handling
-        try:
-            mark_attendance(present_students, self.current_section)
-        except PermissionError:
-            styled_message(self, "File Access Error",
-                           "Cannot save attendance - the CSV file is currently open in another program.\n\n"
-                           "Please close the file (e.g., in Excel) and try again.", "warning")
-            self.progress_bar.setVisible(False)
-            self.status_label.setText("")
-            self.select_btn.setEnabled(True)
+    def on_attendance_failed(self, title, message, msg_type):
+        if self.sender() is not self.worker:
             return
+        self.finish_run()
+        self.progress_bar.setVisible(False)
+        self.status_label.setText("")
+        styled_message(self, title, message, msg_type)
 
-        os.makedirs("attendance_images", exist_ok=True)
-        output_path = f"attendance_images/{date.today()}_{self.current_section.replace(' ', '_')}.jpg"
-        cv2.imwrite(output_path, img)
+    def on_attendance_cancelled(self):
+        if self.sender() is not self.worker:
+            return
+        self.finish_run()
+        self.progress_bar.setVisible(False)
+        self.status_label.setText("Processing cancelled - attendance not marked.")
 
-        # Update preview
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, ch = img_rgb.shape
-        bytes_per_line = ch * w
-        q_img = QImage(img_rgb.data, w, h, bytes_per_line,
-                       QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_img)
+    def on_attendance_completed(self, result):
+        if self.sender() is not self.worker:
+            return
+        self.finish_run()
+        img = result["image"]
+        total_faces = result["total_faces"]
+        present_students = result["present_students"]
+        output_path = result["output_path"]
 
+        # Update preview: shrink first so only a label-sized buffer is converted
         preview_size = self.preview_label.size()
-        scaled = pixmap.scaled(preview_size.width(
-        ) - 40, preview_size.height() - 40, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.preview_label.setPixmap(scaled)
+        small = downscale(img, max(1, preview_size.width() - 40),
+                          max(1, preview_size.height() - 40))
+        img_rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        h, w, ch = img_rgb.shape
+        q_img = QImage(img_rgb.data, w, h, ch * w, QImage.Format_RGB888)
+        self.preview_label.setPixmap(QPixmap.fromImage(q_img))
         self.preview_label.setStyleSheet(
             "background: transparent; padding: 10px;")
 
-        self.progress_bar.setValue(100)
-        self.status_label.setText(
-            f"✅ Attendance marked for {self.current_section}!")
-
         self.results_frame.setVisible(True)
         self.results_count.setText(
             f"Detected: {total_faces} faces | Recognized: {len(present_students)} students")
@@ -589,8 +578,8 @@ class AttendancePage(QWidget):
         else:
             self.results_list.setText("No enrolled students recognized.")
 
-        self.select_btn.setEnabled(True)
         self.select_btn.setText("📁  Process Another Image")
 
+        saved = f"\n\nImage saved to:\n{output_path}" if output_path else ""
         styled_message(self, "Attendance Marked",
-                       f"Attendance marked successfully for {self.current_section}!\n\nFaces detected: {total_faces}\nStudents recognized: {len(present_students)}\n\nImage saved to:\n{output_path}", "info")
+                       f"Attendance marked successfully for {self.current_section}!\n\nFaces detected: {total_faces}\nStudents recognized: {len(present_students)}{saved}", "info")
@@ -1,17 +1,13 @@
 import os
-import cv2
-import pickle
-import numpy as np
 
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
-    QFileDialog, QLineEdit, QMessageBox, QProgressBar, QScrollArea, QGridLayout
+    QFileDialog, QLineEdit, QMessageBox, QProgressBar, QScrollArea, QGridLayout, QComboBox
 )
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap
 
-from utils.face_utils import extract_embedding
-from utils.csv_utils import add_student_column
+from gui.workers import EnrollmentWorker
 
 
 def styled_message(parent, title, message, msg_type="info"):
@@ -65,8 +61,20 @@ class EnrollPage(QWidget):
         super().__init__(parent)
         self.setStyleSheet("background: transparent;")
         self.images = []
+        self.worker = None
+        self.finishing_worker = None  # Reported its result; thread still winding down
         self.setup_ui()
     
+    def set_models_status(self, ready, text=None):
+        """Show whether the recognition models are loaded and warmed up"""
+        if text is None:
+            text = "✅ Recognition models ready" if ready else "⏳ Loading recognition models..."
+        color = "#27AE60" if ready else "#E67E22"
+        self.model_status_label.setText(text)
+        self.model_status_label.setStyleSheet(
+            f"font-size: 12px; color: {color}; background: transparent; font-family: 'Segoe UI', Arial, sans-serif;")
+        self.model_status_label.setVisible(True)
+    
     def setup_ui(self):
         main_layout = QVBoxLayout()
         main_layout.setContentsMargins(0, 0, 0, 0)
@@ -110,7 +118,7 @@ class EnrollPage(QWidget):
         nav_layout.setContentsMargins(30, 0, 30, 0)
         nav_layout.setSpacing(20)
         
-        back_btn = QPushButton("← Back")
+        self.back_btn = back_btn = QPushButton("← Back")
         back_btn.setStyleSheet("""
             QPushButton {
                 background: transparent;
@@ -185,9 +193,16 @@ class EnrollPage(QWidget):
         subtitle.setAlignment(Qt.AlignCenter)
         subtitle.setStyleSheet("font-size: 14px; color: #7F8C8D; background: transparent; font-family: 'Segoe UI', Arial, sans-serif;")
         
+        # Model readiness (filled in by MainWindow's warm-up worker)
+        self.model_status_label = QLabel("")
+        self.model_status_label.setAlignment(Qt.AlignCenter)
+        self.model_status_label.setWordWrap(True)
+        self.model_status_label.setVisible(False)
+        
         layout.addWidget(icon_label)
         layout.addWidget(title)
         layout.addWidget(subtitle)
+        layout.addWidget(self.model_status_label)
         layout.addSpacing(20)
         
         # Name Input
@@ -234,10 +249,43 @@ class EnrollPage(QWidget):
             }
         """)
         
+        # Section (the attendance matcher searches this roster first)
+        section_label = QLabel("Section")
+        section_label.setStyleSheet("font-size: 14px; font-weight: bold; color: #2C3E50; background: transparent; font-family: 'Segoe UI', Arial, sans-serif;")
+        
+        self.section_input = QComboBox()
+        self.section_input.addItems(["BSCS 5A", "BSCS 5B"])
+        self.section_input.setStyleSheet("""
+            QComboBox {
+                background-color: #F8F9FA;
+                color: #2C3E50;
+                border: 2px solid #E0E0E0;
+                border-radius: 10px;
+                padding: 12px 15px;
+                font-size: 14px;
+                font-family: 'Segoe UI', Arial, sans-serif;
+            }
+            QComboBox:hover {
+                border: 2px solid #4A90E2;
+            }
+            QComboBox::drop-down {
+                border: none;
+                width: 30px;
+            }
+            QComboBox QAbstractItemView {
+                background-color: white;
+                color: #2C3E50;
+                selection-background-color: #4A90E2;
+                selection-color: white;
+            }
+        """)
+        
         layout.addWidget(name_label)
         layout.addWidget(self.name_input)
         layout.addWidget(sap_label)
         layout.addWidget(self.sap_input)
+        layout.addWidget(section_label)
+        layout.addWidget(self.section_input)
         layout.addSpacing(10)
         
         # Image Selection
@@ -353,10 +401,21 @@ class EnrollPage(QWidget):
         panel.setLayout(layout)
         return panel
     
+    def is_enrolling(self):
+        try:
+            return self.worker is not None and self.worker.isRunning()
+        except RuntimeError:
+            # Finished and already removed by deleteLater
+            return False
+
     def reset_form(self):
         """Reset all form fields"""
+        if self.is_enrolling():
+            # Keep showing the running enrollment; its signals re-enable the form
+            return
         self.name_input.clear()
         self.sap_input.clear()
+        self.section_input.setCurrentIndex(0)
         self.images = []
         self.image_status.setText("📷 No images selected")
         self.image_status.setStyleSheet("font-size: 16px; font-weight: bold; color: #7F8C8D; background: transparent; font-family: 'Segoe UI', Arial, sans-serif; padding: 15px;")
@@ -443,69 +502,56 @@ class EnrollPage(QWidget):
             styled_message(self, "Student Exists", "A student with this name and SAP ID already exists.", "warning")
             return
         
+        if self.is_enrolling():
+            return
+
         self.submit_btn.setEnabled(False)
         self.select_btn.setEnabled(False)
+        self.back_btn.setEnabled(False)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.status_label.setText("Processing images...")
         
-        from PyQt5.QtWidgets import QApplication
-        
-        os.makedirs(student_path)
-        embeddings = []
-        
-        for i, img_path in enumerate(self.images):
-            self.progress_bar.setValue((i + 1) * 10)
-            self.status_label.setText(f"Processing image {i + 1} of 10...")
-            QApplication.processEvents()
-            
-            img = cv2.imread(img_path)
-            emb = extract_embedding(img)
-            if emb is None:
-                import shutil
-                shutil.rmtree(student_path)
-                self.progress_bar.setVisible(False)
-                self.status_label.setText("")
-                self.submit_btn.setEnabled(True)
-                self.select_btn.setEnabled(True)
-                styled_message(self, "Face Detection Error",
-                                    f"Could not detect a face in image {i + 1}.\nPlease ensure all images contain clear, visible faces.", "warning")
-                return
-            embeddings.append(emb)
-        
-        self.status_label.setText("Creating face embeddings...")
-        QApplication.processEvents()
-        
-        mean_embedding = np.mean(embeddings, axis=0)
-        
-        self.status_label.setText("Saving images...")
-        QApplication.processEvents()
-        
-        for img_path in self.images:
-            cv2.imwrite(os.path.join(student_path, os.path.basename(img_path)), cv2.imread(img_path))
-        
-        self.status_label.setText("Updating database...")
-        QApplication.processEvents()
-        
-        db_path = "face_db.pkl"
-        face_db = {}
-        
-        if os.path.exists(db_path):
-            with open(db_path, "rb") as f:
-                face_db = pickle.load(f)
-        
-        face_db[folder_name] = [mean_embedding]
-        
-        with open(db_path, "wb") as f:
-            pickle.dump(face_db, f)
-        
-        add_student_column(folder_name)
-        
-        self.progress_bar.setValue(100)
-        self.status_label.setText("✅ Enrollment complete!")
-        
+        # Decoding, detection, embedding and file copies run in EnrollmentWorker
+        self.enrolling_name = name
+        self.enrolling_sap = sap
+        self.worker = EnrollmentWorker(self.images, folder_name, student_path,
+                                       self.section_input.currentText(), self)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.completed.connect(self.on_enrollment_completed)
+        self.worker.failed.connect(self.on_enrollment_failed)
+        self.worker.finished.connect(self.on_worker_finished)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.worker.start()
+    
+    def on_worker_finished(self):
+        if self.sender() is self.finishing_worker:
+            self.finishing_worker = None
+
+    def on_progress(self, value, text):
+        if self.sender() is not self.worker:
+            return
+        self.progress_bar.setValue(value)
+        self.status_label.setText(text)
+    
+    def on_enrollment_failed(self, title, message, msg_type):
+        # Signals from a worker this page no longer tracks are stale
+        if self.sender() is not self.worker:
+            return
+        self.finishing_worker, self.worker = self.worker, None
+        self.progress_bar.setVisible(False)
+        self.status_label.setText("")
+        self.submit_btn.setEnabled(True)
+        self.select_btn.setEnabled(True)
+        self.back_btn.setEnabled(True)
+        styled_message(self, title, message, msg_type)
+    
+    def on_enrollment_completed(self, result):
+        if self.sender() is not self.worker:
+            return
+        self.finishing_worker, self.worker = self.worker, None
+        self.back_btn.setEnabled(True)
         styled_message(self, "Success",
-                                f"Student '{name}' has been enrolled successfully!\n\nSAP ID: {sap}\nImages processed: 10", "info")
+                                f"Student '{self.enrolling_name}' has been enrolled successfully!\n\nSAP ID: {self.enrolling_sap}\nSection: {result['section']}\nImages processed: {result['image_count']}", "info")
         
         self.go_back.emit()
-
@@ -1,6 +1,3 @@
-import os
-import pickle
-import csv
 from datetime import date
 
 from PyQt5.QtWidgets import (
@@ -16,8 +13,13 @@ from gui.attendance_page import AttendancePage
 from gui.analytics_page import AnalyticsPage
 from gui.reports_page import ReportsPage
 from utils.csv_utils import (
-    get_low_attendance_students
+    get_low_attendance_students,
+    get_attendance_index,
+    attendance_signature
 )
+from utils.face_store import get_store, store_signature
+from utils.face_utils import WARM_UP_MODELS
+from gui.workers import ModelWarmupWorker
 
 
 def show_message(parent, title, message, msg_type="info"):
@@ -268,13 +270,51 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(self.stacked_widget)
 
-        # Refresh timer for stats
+        # Refresh timer for stats; ticks are no-ops unless the data changed
+        self.last_stats_signature = None
         self.refresh_timer = QTimer(self)
-        self.refresh_timer.timeout.connect(self.update_statistics)
+        self.refresh_timer.timeout.connect(self.refresh_statistics)
         self.refresh_timer.start(5000)
 
         # Initial stats update
-        self.update_statistics()
+        self.update_statistics(force=True)
+
+    # ==================== MODELS ====================
+    def start_model_warmup(self):
+        """Load and warm up the recognition models in the background"""
+        for page in (self.enroll_page, self.attendance_page):
+            page.set_models_status(False)
+        self.model_warmup = ModelWarmupWorker(WARM_UP_MODELS, self)
+        self.model_warmup.ready.connect(self.on_models_ready)
+        self.model_warmup.failed.connect(self.on_models_failed)
+        self.model_warmup.start()
+
+    def on_models_ready(self):
+        for page in (self.enroll_page, self.attendance_page):
+            page.set_models_status(True)
+
+    def on_models_failed(self, error):
+        for page in (self.enroll_page, self.attendance_page):
+            page.set_models_status(False, f"⚠️ Models failed to load: {error}")
+
+    def closeEvent(self, event):
+        """Stop background threads before Qt destroys them with the window"""
+        self.refresh_timer.stop()
+        self.attendance_page.cancel_attendance()
+        workers = (self.attendance_page.worker, self.attendance_page.stopping_worker,
+                   self.enroll_page.worker, self.enroll_page.finishing_worker,
+                   getattr(self, "model_warmup", None))
+        for worker in workers:
+            try:
+                running = worker is not None and worker.isRunning()
+            except RuntimeError:
+                # Finished and already removed by deleteLater
+                continue
+            if running:
+                # The warm-up can't be interrupted inside TensorFlow; enrollment
+                # finishes its store write; recognition stops at its next cancel point
+                worker.wait()
+        super().closeEvent(event)
 
     # ==================== NAVIGATION ====================
     def go_to_dashboard(self):
@@ -692,6 +732,15 @@ class MainWindow(QMainWindow):
         self.students_layout.setSpacing(10)
         self.students_container.setLayout(self.students_layout)
 
+        # Student rows are diffed in update_students_list; these two stay last
+        self.student_frames = {}
+        self.no_students_label = QLabel("No students enrolled yet")
+        self.no_students_label.setAlignment(Qt.AlignCenter)
+        self.no_students_label.setStyleSheet(
+            "font-size: 14px; color: #95A5A6; background: transparent; padding: 20px; font-family: 'Segoe UI', Arial, sans-serif;")
+        self.students_layout.addWidget(self.no_students_label)
+        self.students_layout.addStretch()
+
         scroll_area.setWidget(self.students_container)
         layout.addWidget(scroll_area, 1)
         section.setLayout(layout)
@@ -754,7 +803,24 @@ class MainWindow(QMainWindow):
         return section
 
     # ==================== STATISTICS ====================
-    def update_statistics(self):
+    def stats_signature(self):
+        """Cheap fingerprint of everything the dashboard shows (a few stat calls)"""
+        return (store_signature(), attendance_signature(), date.today())
+
+    def refresh_statistics(self):
+        """Timer tick: only recompute when the dashboard is visible and its data changed"""
+        if self.stacked_widget.currentIndex() != 0:
+            return
+        self.update_statistics()
+
+    def update_statistics(self, force=False):
+        signature = self.stats_signature()
+        if not force and signature == self.last_stats_signature:
+            return
+        students_changed = self.last_stats_signature is None or \
+            signature[0] != self.last_stats_signature[0]
+        self.last_stats_signature = signature
+
         total_students = self.get_total_students()
         self.update_stat_card(self.total_students_card, str(total_students))
 
@@ -776,128 +842,101 @@ class MainWindow(QMainWindow):
         else:
             self.alert_label.setVisible(False)
 
-        self.update_students_list()
+        if force or students_changed:
+            self.update_students_list()
 
     def update_stat_card(self, card, value):
         layout = card.layout()
         if layout and layout.count() > 1:
             value_label = layout.itemAt(1).widget()
-            if value_label:
+            if value_label and value_label.text() != value:
                 value_label.setText(value)
 
     def get_total_students(self):
         try:
-            if os.path.exists("face_db.pkl"):
-                with open("face_db.pkl", "rb") as f:
-                    face_db = pickle.load(f)
-                return len(face_db)
+            return len(get_store())
         except:
             pass
         return 0
 
     def get_today_attendance(self):
         try:
-            today = str(date.today())
-            if os.path.exists("data/attendance.csv"):
-                with open("data/attendance.csv", "r") as f:
-                    reader = csv.reader(f)
-                    rows = list(reader)
-                    if len(rows) > 1:
-                        header = rows[0]
-                        # Check if Section column exists
-                        has_section = len(
-                            header) > 1 and header[1] == "Section"
-                        start_idx = 2 if has_section else 1
-
-                        count = 0
-                        for row in rows[1:]:
-                            if row[0] == today:
-                                count += row[start_idx:].count(
-                                    "P") if len(row) > start_idx else 0
-                        return count
+            index = get_attendance_index()
+            sessions = index.by_date.get(str(date.today()), [])
+            if sessions:
+                return int(index.present_counts(sessions).sum())
         except:
             pass
         return 0
 
     def get_total_records(self):
         try:
-            if os.path.exists("data/attendance.csv"):
-                with open("data/attendance.csv", "r") as f:
-                    reader = csv.reader(f)
-                    rows = list(reader)
-                    return max(0, len(rows) - 1)
+            return len(get_attendance_index())
         except:
             pass
         return 0
 
+    def create_student_frame(self, student):
+        student_frame = QFrame()
+        student_frame.setStyleSheet("""
+            QFrame {
+                background: rgba(74, 144, 226, 0.1);
+                border-radius: 10px;
+                border-left: 4px solid #4A90E2;
+            }
+        """)
+
+        frame_layout = QHBoxLayout()
+        frame_layout.setContentsMargins(15, 12, 15, 12)
+
+        student_name = QLabel(f"👤 {student}")
+        student_name.setStyleSheet("""
+            QLabel {
+                font-size: 15px;
+                font-weight: bold;
+                color: #2C3E50;
+                background: transparent;
+                font-family: 'Segoe UI', Arial, sans-serif;
+            }
+        """)
+
+        frame_layout.addWidget(student_name)
+        frame_layout.addStretch()
+
+        student_frame.setLayout(frame_layout)
+        return student_frame
+
     def update_students_list(self):
+        """Add and remove student rows to match the store instead of rebuilding them all"""
         if not hasattr(self, 'students_layout'):
             return
 
         layout = self.students_layout
 
-        # Clear existing items
-        while layout.count():
-            item = layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-
         try:
-            if os.path.exists("face_db.pkl"):
-                with open("face_db.pkl", "rb") as f:
-                    face_db = pickle.load(f)
-
-                students = list(face_db.keys())
-
-                if not students:
-                    no_data = QLabel("No students enrolled yet")
-                    no_data.setAlignment(Qt.AlignCenter)
-                    no_data.setStyleSheet(
-                        "font-size: 14px; color: #95A5A6; background: transparent; padding: 20px; font-family: 'Segoe UI', Arial, sans-serif;")
-                    layout.addWidget(no_data)
-                    return
-
-                for student in sorted(students):
-                    student_frame = QFrame()
-                    student_frame.setStyleSheet("""
-                        QFrame {
-                            background: rgba(74, 144, 226, 0.1);
-                            border-radius: 10px;
-                            border-left: 4px solid #4A90E2;
-                        }
-                    """)
-
-                    frame_layout = QHBoxLayout()
-                    frame_layout.setContentsMargins(15, 12, 15, 12)
-
-                    student_name = QLabel(f"👤 {student}")
-                    student_name.setStyleSheet("""
-                        QLabel {
-                            font-size: 15px;
-                            font-weight: bold;
-                            color: #2C3E50;
-                            background: transparent;
-                            font-family: 'Segoe UI', Arial, sans-serif;
-                        }
-                    """)
-
-                    frame_layout.addWidget(student_name)
-                    frame_layout.addStretch()
-
-                    student_frame.setLayout(frame_layout)
-                    layout.addWidget(student_frame)
-
-                # Add stretch at the end
-                layout.addStretch()
-            else:
-                no_data = QLabel("No students enrolled yet")
-                no_data.setAlignment(Qt.AlignCenter)
-                no_data.setStyleSheet(
-                    "font-size: 14px; color: #95A5A6; background: transparent; padding: 20px; font-family: 'Segoe UI', Arial, sans-serif;")
-                layout.addWidget(no_data)
+            students = sorted(get_store().names)
         except Exception as e:
-            no_data = QLabel(f"Error loading students: {str(e)}")
-            no_data.setAlignment(Qt.AlignCenter)
-            no_data.setStyleSheet(
+            students = []
+            self.no_students_label.setText(f"Error loading students: {str(e)}")
+            self.no_students_label.setStyleSheet(
                 "font-size: 14px; color: #E74C3C; background: transparent; padding: 20px; font-family: 'Segoe UI', Arial, sans-serif;")
-            layout.addWidget(no_data)
+        else:
+            self.no_students_label.setText("No students enrolled yet")
+            self.no_students_label.setStyleSheet(
+                "font-size: 14px; color: #95A5A6; background: transparent; padding: 20px; font-family: 'Segoe UI', Arial, sans-serif;")
+
+        current = set(students)
+        for student in list(self.student_frames):
+            if student not in current:
+                frame = self.student_frames.pop(student)
+                layout.removeWidget(frame)
+                frame.deleteLater()
+
+        # Existing rows are already sorted, so inserting at i keeps the order
+        for i, student in enumerate(students):
+            if student not in self.student_frames:
+                frame = self.create_student_frame(student)
+                self.student_frames[student] = frame
+                layout.insertWidget(i, frame)
+
+        self.no_students_label.setVisible(not students)
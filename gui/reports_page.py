@@ -12,9 +12,10 @@ from fpdf import FPDF
 
 from utils.csv_utils import (
     get_attendance_by_date_range,
-    get_all_student_attendance_rates,
+    get_attendance_summary,
     get_students_list,
-    get_low_attendance_students
+    get_low_attendance_students,
+    export_attendance_csv
 )
 
 
@@ -408,8 +409,27 @@ class ReportsPage(QWidget):
         """)
         export_btn.clicked.connect(self.export_pdf)
 
+        csv_btn = QPushButton("📊  Export to CSV")
+        csv_btn.setFixedHeight(55)
+        csv_btn.setStyleSheet("""
+            QPushButton {
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #4A90E2, stop:1 #357ABD);
+                color: white;
+                border: none;
+                border-radius: 10px;
+                font-size: 16px;
+                font-weight: bold;
+                font-family: 'Segoe UI', Arial, sans-serif;
+            }
+            QPushButton:hover {
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #5BA0F2, stop:1 #4590CD);
+            }
+        """)
+        csv_btn.clicked.connect(self.export_csv)
+
         layout.addWidget(preview_btn)
         layout.addWidget(export_btn)
+        layout.addWidget(csv_btn)
 
         panel.setLayout(layout)
         return panel
@@ -544,7 +564,8 @@ class ReportsPage(QWidget):
         self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
     def preview_student_summary(self):
-        rates = get_all_student_attendance_rates()
+        summary = get_attendance_summary()
+        rates = {student: stats["rate"] for student, stats in summary.items()}
 
         if not rates:
             self.preview_status.setText("No student data available")
@@ -558,20 +579,23 @@ class ReportsPage(QWidget):
         sorted_rates = sorted(rates.items(), key=lambda x: x[1], reverse=True)
 
         self.preview_table.setRowCount(len(sorted_rates))
-        self.preview_table.setColumnCount(3)
+        self.preview_table.setColumnCount(4)
         self.preview_table.setHorizontalHeaderLabels(
-            ["Student Name", "Attendance Rate", "Status"])
+            ["Student Name", "Attendance Rate", "Sessions", "Status"])
 
         for row_idx, (student, rate) in enumerate(sorted_rates):
+            stats = summary[student]
             self.preview_table.setItem(row_idx, 0, QTableWidgetItem(student))
             self.preview_table.setItem(
                 row_idx, 1, QTableWidgetItem(f"{rate:.1f}%"))
+            self.preview_table.setItem(
+                row_idx, 2, QTableWidgetItem(f"{stats['present']}/{stats['total']}"))
 
             status = "✅ Good" if rate >= 75 else "⚠️ Low"
             status_item = QTableWidgetItem(status)
             if rate < 75:
                 status_item.setBackground(Qt.yellow)
-            self.preview_table.setItem(row_idx, 2, status_item)
+            self.preview_table.setItem(row_idx, 3, status_item)
 
         self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
@@ -677,6 +701,27 @@ class ReportsPage(QWidget):
             styled_message(
                 self, "Error", f"Failed to export PDF:\n{str(e)}", "warning")
 
+    def export_csv(self):
+        """Export all attendance as a wide Date,Section,<student>... CSV"""
+        default_name = f"attendance_{date.today()}.csv"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Attendance CSV", default_name, "CSV Files (*.csv)"
+        )
+
+        if not file_path:
+            return
+
+        try:
+            export_attendance_csv(file_path)
+            styled_message(
+                self, "Success", f"Attendance exported successfully!\n\nSaved to:\n{file_path}", "info")
+        except PermissionError:
+            styled_message(
+                self, "File Access Error", "Cannot write the CSV - the file is currently open in another program.", "warning")
+        except Exception as e:
+            styled_message(
+                self, "Error", f"Failed to export CSV:\n{str(e)}", "warning")
+
     def export_full_report(self, pdf, section, start, end):
         header, data = get_attendance_by_date_range(start, end, section)
 
@@ -709,7 +754,8 @@ class ReportsPage(QWidget):
             pdf.cell(0, 6, f"... and {len(data) - 50} more records", 0, 1, 'C')
 
     def export_student_summary(self, pdf):
-        rates = get_all_student_attendance_rates()
+        summary = get_attendance_summary()
+        rates = {student: stats["rate"] for student, stats in summary.items()}
 
         if not rates:
             pdf.cell(0, 10, "No student data available", 0, 1, 'C')
@@ -735,18 +781,21 @@ class ReportsPage(QWidget):
 
         # Table
         pdf.set_font('Arial', 'B', 9)
-        pdf.cell(100, 8, "Student Name", 1, 0, 'C')
-        pdf.cell(45, 8, "Attendance %", 1, 0, 'C')
-        pdf.cell(45, 8, "Status", 1, 1, 'C')
+        pdf.cell(85, 8, "Student Name", 1, 0, 'C')
+        pdf.cell(35, 8, "Attendance %", 1, 0, 'C')
+        pdf.cell(35, 8, "Sessions", 1, 0, 'C')
+        pdf.cell(35, 8, "Status", 1, 1, 'C')
 
         pdf.set_font('Arial', '', 9)
         for student, rate in sorted_rates:
+            stats = summary[student]
             status = "Good" if rate >= 75 else "Low"
             student_name = student[:30] + \
                 '..' if len(student) > 32 else student
-            pdf.cell(100, 6, student_name, 1, 0)
-            pdf.cell(45, 6, f"{rate:.1f}%", 1, 0, 'C')
-            pdf.cell(45, 6, status, 1, 1, 'C')
+            pdf.cell(85, 6, student_name, 1, 0)
+            pdf.cell(35, 6, f"{rate:.1f}%", 1, 0, 'C')
+            pdf.cell(35, 6, f"{stats['present']}/{stats['total']}", 1, 0, 'C')
+            pdf.cell(35, 6, status, 1, 1, 'C')
 
     def export_low_attendance(self, pdf):
         low_students = get_low_attendance_students(75.0)
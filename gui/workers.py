@@ -0,0 +1,293 @@
+import os
+import shutil
+import logging
+import traceback
+from datetime import date
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from utils.face_utils import (
+    recognize_face, load_images, extract_embeddings, select_prototypes,
+    get_yolo, get_embedder, models_loaded, models_warming_up, load_models, warm_up_models,
+    THRESHOLD, EMBED_BATCH_SIZE
+)
+from utils.face_store import get_store, get_section_gallery
+from utils.csv_utils import mark_attendance, add_student_column
+from utils.pipeline import RecognitionPipeline
+from utils.image_writer import get_image_writer
+from utils.metrics import span
+from utils.log_config import diagnostics_on
+
+logger = logging.getLogger(__name__)
+
+# Progress shown as each pipeline stage finishes: (percent, status text)
+STAGE_PROGRESS = {
+    "decode": (30, "Detecting faces..."),
+    "detect": (45, "Processing {faces} detected faces..."),
+    "match": (90, "Annotating image..."),
+}
+
+
+class _Cancelled(Exception):
+    """Raised inside a worker when the user cancels a run"""
+
+
+class RecognitionWorker(QThread):
+    """Runs detection, embedding, matching and saving for one classroom photo off the UI thread"""
+
+    # (percent, status text)
+    progress = pyqtSignal(int, str)
+    # (face index, name, distance) as each face is matched
+    face_recognized = pyqtSignal(int, str, float)
+    # dict with total_faces, present_students, output_path and the annotated image
+    completed = pyqtSignal(dict)
+    # (title, message, message type) for styled_message
+    failed = pyqtSignal(str, str, str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, img_path, section, embed_batch_size=EMBED_BATCH_SIZE, parent=None):
+        super().__init__(parent)
+        self.img_path = img_path
+        self.section = section
+        self.embed_batch_size = embed_batch_size
+        self._cancel_requested = False
+
+    def cancel(self):
+        """Ask the run to stop at the next checkpoint; attendance is not marked"""
+        self._cancel_requested = True
+
+    def check_cancelled(self):
+        if self._cancel_requested:
+            raise _Cancelled()
+
+    def run(self):
+        try:
+            with span("attendance_run"):
+                self.process()
+        except _Cancelled:
+            logger.info("Attendance run cancelled for %s", self.img_path)
+            self.cancelled.emit()
+        except Exception as e:
+            logger.error("Attendance run failed - %s", e)
+            logger.error(traceback.format_exc())
+            self.failed.emit("Error", f"Processing failed:\n{e}", "error")
+
+    def process(self):
+        self.progress.emit(0, "Loading face database...")
+
+        store = get_store()
+        if len(store) == 0:
+            logger.error("No enrolled students in the face store!")
+            self.failed.emit(
+                "Error", "No students enrolled yet. Please enroll students first.", "warning")
+            return
+
+        logger.info("Face database loaded: %d enrolled students", len(store))
+        # The full listing touches every student's rows, so only in diagnostic mode
+        if diagnostics_on(logger):
+            for name in store.names:
+                embeddings = store.embeddings(name)
+                logger.debug("  - %s: %d embedding(s)", name, len(embeddings))
+                if len(embeddings):
+                    logger.debug("    Embedding shape: %s", embeddings[0].shape)
+                    logger.debug("    Embedding sample: %s...", embeddings[0][:5])
+
+        self.check_cancelled()
+
+        # First use loads the models; during the background warm-up inference
+        # waits for it on the model locks
+        if not models_loaded() or models_warming_up():
+            self.progress.emit(15, "Loading recognition models...")
+        yolo = get_yolo()
+        embedder = get_embedder()
+        logger.debug("Running YOLO detection with model: %s", yolo)
+        logger.debug("Embedder being used: %s", embedder)
+
+        # Shared gallery, only rebuilt when the store changes on disk; the
+        # section's roster is searched first
+        gallery = get_section_gallery(self.section)
+
+        def on_batch(done, total):
+            # Embedding is the slow stage, so it is also the main cancel point
+            self.check_cancelled()
+            self.progress.emit(50 + int(30 * done / max(total, 1)),
+                               f"Embedding faces ({done}/{total})...")
+
+        def on_stage(job, stage):
+            if stage in STAGE_PROGRESS:
+                percent, text = STAGE_PROGRESS[stage]
+                self.progress.emit(percent, text.format(faces=len(job.get("boxes", ()))))
+
+        self.progress.emit(20, "Reading image...")
+        pipeline = RecognitionPipeline(gallery, self.embed_batch_size, on_stage=on_stage)
+        job = {"path": self.img_path, "on_batch": on_batch}
+        for job in pipeline.run([job], should_stop=lambda: self._cancel_requested):
+            pass
+        self.check_cancelled()
+        if diagnostics_on(logger):
+            logger.debug("Pipeline stages:\n%s", pipeline.format_stats())
+
+        if job.get("error") == "unreadable image":
+            self.failed.emit(
+                "Error", "Could not read the selected image.", "warning")
+            return
+        if "error" in job:
+            raise RuntimeError(job["error"])
+
+        img = job["image"]
+        total_faces = len(job["boxes"])
+        logger.info("Image loaded: %s, shape: %s", self.img_path, img.shape)
+        logger.info("YOLO detected %d faces", total_faces)
+
+        if total_faces == 0:
+            self.failed.emit(
+                "Error", "No faces detected in the image. Please try a different image.", "warning")
+            return
+
+        logger.info("Embedded %d faces in batches of %d", len(job["crops"]), self.embed_batch_size)
+
+        present_students = job["present"]
+        recognized_count = 0
+        # Per-face records are DEBUG; checked once rather than per face
+        diagnostics = diagnostics_on(logger)
+        for (face_index, box, name, dist), emb in zip(job["matches"], job["embeddings"]):
+            if diagnostics:
+                # Full distance table for the first 3 faces
+                if face_index <= 3:
+                    logger.debug("Face %d: Detailed comparison:", face_index)
+                    recognize_face(emb, gallery, verbose=True)
+                if name != "Unknown":
+                    logger.debug("Face %d: RECOGNIZED as '%s' (distance %.4f)",
+                                 face_index, name, dist)
+                else:
+                    logger.debug("Face %d: Unknown (distance %.4f > threshold %s)",
+                                 face_index, dist, THRESHOLD)
+            if name != "Unknown":
+                recognized_count += 1
+            self.face_recognized.emit(face_index, name, float(dist))
+
+        logger.info("Recognized %d out of %d faces", recognized_count, total_faces)
+        logger.debug("Present students: %s", present_students)
+
+        # Last point where a cancel leaves no trace on disk
+        self.check_cancelled()
+        self.progress.emit(95, "Saving attendance records...")
+
+        # Try to mark attendance with section and error handling
+        try:
+            mark_attendance(present_students, self.section)
+        except PermissionError:
+            self.failed.emit("File Access Error",
+                             "Cannot save attendance - the CSV file is currently open in another program.\n\n"
+                             "Please close the file (e.g., in Excel) and try again.", "warning")
+            return
+
+        os.makedirs("attendance_images", exist_ok=True)
+        # Encoded on the writer thread; img is not modified after this point
+        output_path = get_image_writer().submit(
+            f"attendance_images/{date.today()}_{self.section.replace(' ', '_')}.jpg", img)
+
+        self.progress.emit(100, f"✅ Attendance marked for {self.section}!")
+        self.completed.emit({
+            "total_faces": total_faces,
+            "present_students": present_students,
+            "output_path": output_path,
+            "image": img,
+        })
+
+
+class EnrollmentWorker(QThread):
+    """Decodes, detects, embeds and stores one student's enrollment images off the UI thread"""
+
+    # (percent, status text)
+    progress = pyqtSignal(int, str)
+    # dict with folder_name, student_path, section and image_count
+    completed = pyqtSignal(dict)
+    # (title, message, message type) for styled_message
+    failed = pyqtSignal(str, str, str)
+
+    def __init__(self, images, folder_name, student_path, section=None, parent=None):
+        super().__init__(parent)
+        self.images = list(images)
+        self.folder_name = folder_name
+        self.student_path = student_path
+        self.section = section
+
+    def run(self):
+        try:
+            self.process()
+        except Exception as e:
+            logger.error("Enrollment failed - %s", e)
+            logger.error(traceback.format_exc())
+            # Don't leave a half-copied dataset folder behind
+            if os.path.isdir(self.student_path):
+                shutil.rmtree(self.student_path, ignore_errors=True)
+            self.failed.emit("Error", f"Enrollment failed:\n{e}", "error")
+
+    def process(self):
+        count = len(self.images)
+        self.progress.emit(5, f"Reading {count} images...")
+        decoded = load_images(self.images)
+
+        self.progress.emit(30, "Detecting faces...")
+        embeddings = extract_embeddings(decoded)
+
+        for i, emb in enumerate(embeddings):
+            if emb is None:
+                self.failed.emit("Face Detection Error",
+                                 f"Could not detect a face in image {i + 1}.\nPlease ensure all images contain clear, visible faces.", "warning")
+                return
+
+        self.progress.emit(70, "Creating face embeddings...")
+        # A few prototypes capture pose and lighting changes that a single mean averages away
+        prototypes = select_prototypes(embeddings)
+
+        self.progress.emit(75, "Saving images...")
+        # Copy the original files byte-for-byte instead of decoding and re-encoding them
+        os.makedirs(self.student_path)
+        for i, img_path in enumerate(self.images):
+            shutil.copy2(img_path, os.path.join(
+                self.student_path, os.path.basename(img_path)))
+            self.progress.emit(75 + int(15 * (i + 1) / count),
+                               f"Saving image {i + 1} of {count}...")
+
+        self.progress.emit(90, "Updating database...")
+
+        # Appends one row block; the rest of the store is not rewritten
+        get_store().add(self.folder_name, prototypes,
+                        sections=[self.section] if self.section else None)
+
+        add_student_column(self.folder_name)
+
+        self.progress.emit(100, "✅ Enrollment complete!")
+        self.completed.emit({
+            "folder_name": self.folder_name,
+            "student_path": self.student_path,
+            "section": self.section,
+            "image_count": count,
+        })
+
+
+class ModelWarmupWorker(QThread):
+    """Loads (and optionally warms up) YOLO and FaceNet after the window is shown"""
+
+    ready = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, warm_up=True, parent=None):
+        super().__init__(parent)
+        self.warm_up = warm_up
+
+    def run(self):
+        try:
+            if self.warm_up:
+                warm_up_models()
+            else:
+                load_models()
+        except Exception as e:
+            logger.error("Model warm-up failed - %s", e)
+            logger.error(traceback.format_exc())
+            self.failed.emit(str(e))
+            return
+        logger.info("Recognition models ready")
+        self.ready.emit()
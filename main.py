@@ -1,5 +1,6 @@
 import sys
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
 from gui.main_window import MainWindow
 
 if __name__ == "__main__":
@@ -328,4 +329,8 @@ if __name__ == "__main__":
     
     window = MainWindow()
     window.show()
+
+    # Models load lazily; start loading (and warming) them once the window is up
+    QTimer.singleShot(0, window.start_model_warmup)
+
     sys.exit(app.exec_())
@@ -0,0 +1,103 @@
+# utils/ann_index.py
+import numpy as np
+
+ANN_ENABLED = True
+ANN_MIN_ROWS = 5000  # Below this a brute-force scan is already fast enough
+ANN_NPROBE = 8  # Lists searched per query: higher = better recall, slower
+ANN_RERANK_K = 10  # Candidates re-ranked with exact distances
+ANN_KMEANS_ITERATIONS = 10
+ANN_TRAIN_SAMPLE = 50000  # Rows used to fit the coarse centroids
+ANN_REBUILD_GROWTH = 2.0  # Retrain once the gallery is this many times the trained size
+
+
+def _sq_distances(queries, points, point_sq_norms=None):
+    """Squared Euclidean distances via ||q||^2 + ||p||^2 - 2 q.p"""
+    if point_sq_norms is None:
+        point_sq_norms = np.einsum("ij,ij->i", points, points)
+    q_norms = np.einsum("ij,ij->i", queries, queries)
+    sq = q_norms[:, None] + point_sq_norms[None, :] - 2.0 * (queries @ points.T)
+    return np.maximum(sq, 0.0, out=sq)
+
+
+def kmeans(data, k, iterations=ANN_KMEANS_ITERATIONS, seed=0):
+    """Plain Lloyd's k-means with random initial centroids; returns (k, dim) centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmin(_sq_distances(data, centroids), axis=1)
+        for c in range(k):
+            members = data[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters so every list stays useful
+                centroids[c] = data[rng.integers(len(data))]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index: gallery rows bucketed by their nearest coarse centroid
+
+    A query only scans the rows in its nprobe nearest buckets instead of the
+    whole gallery. Like FaceGallery it is immutable; enrollment produces an
+    updated copy whose new rows are assigned to the existing centroids.
+    """
+
+    def __init__(self, centroids, assign, trained_rows):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.assign = np.asarray(assign, dtype=np.int32)  # gallery row -> list
+        self.trained_rows = trained_rows
+        # CSR layout: rows of list c are order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(self.assign, kind="stable")
+        self.offsets = np.searchsorted(self.assign[self.order], np.arange(len(self.centroids) + 1))
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, seed=0):
+        """Fit centroids on (a sample of) the matrix and bucket every row"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(matrix)))
+        n_lists = max(1, min(n_lists, len(matrix)))
+
+        rng = np.random.default_rng(seed)
+        sample = matrix
+        if len(matrix) > ANN_TRAIN_SAMPLE:
+            sample = matrix[rng.choice(len(matrix), size=ANN_TRAIN_SAMPLE, replace=False)]
+        centroids = kmeans(sample, n_lists, seed=seed)
+        index = cls(centroids, np.empty(0, dtype=np.int32), len(matrix))
+        return index.with_rows(np.ones(0, dtype=bool), matrix)
+
+    def __len__(self):
+        return len(self.assign)
+
+    def nearest_lists(self, queries, nprobe=ANN_NPROBE):
+        """(queries, nprobe) ids of the lists nearest to each query"""
+        sq = _sq_distances(queries, self.centroids, self.centroid_sq_norms)
+        nprobe = min(nprobe, len(self.centroids))
+        if nprobe == len(self.centroids):
+            return np.tile(np.arange(nprobe), (len(queries), 1))
+        return np.argpartition(sq, nprobe - 1, axis=1)[:, :nprobe]
+
+    def assign_rows(self, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return self.nearest_lists(vectors, 1)[:, 0].astype(np.int32)
+
+    def with_rows(self, keep, new_vectors):
+        """Copy with only the kept rows (renumbered in order) plus appended new rows"""
+        assign = np.concatenate([self.assign[keep], self.assign_rows(new_vectors)])
+        return IVFIndex(self.centroids, assign, self.trained_rows)
+
+    def list_rows(self, c):
+        """Gallery rows bucketed in list c"""
+        return self.order[self.offsets[c]:self.offsets[c + 1]]
+
+
+def index_gallery(gallery, min_rows=ANN_MIN_ROWS):
+    """Attach (or retrain) an IVF index on a large gallery; small galleries are left exact"""
+    rows = len(gallery.matrix)
+    if not ANN_ENABLED or rows < min_rows:
+        gallery.ann = None
+    elif gallery.ann is None or rows > ANN_REBUILD_GROWTH * gallery.ann.trained_rows:
+        gallery.ann = IVFIndex.build(gallery.matrix)
+    return gallery
@@ -0,0 +1,230 @@
+# utils/attendance_store.py
+import csv
+import os
+from datetime import datetime
+
+import numpy as np
+
+STUDENTS_PATH = "data/students.csv"  # One row per student, in wide-column order
+SESSIONS_PATH = "data/sessions.csv"  # One row per session: Date, Section, Present bitset
+LEGACY_CSV_PATH = "data/attendance.csv"  # Wide Date,Section,<student>... file, migrated once
+
+
+def encode_present(indices):
+    """Hex bitset with bit i set for every present student index i"""
+    mask = 0
+    for i in indices:
+        mask |= 1 << i
+    return format(mask, "x")
+
+
+def decode_present(mask_hex):
+    """Set bit positions of a hex bitset"""
+    bits = bin(int(mask_hex or "0", 16))[:1:-1]
+    return [i for i, bit in enumerate(bits) if bit == "1"]
+
+
+class AttendanceStore:
+    """Append-only attendance log: a student roster plus one bitset row per session
+
+    Marking a session appends one line and enrolling a student appends one
+    line; history is never rewritten. Students enrolled after a session are
+    simply absent from its bitset, matching the "A" the wide CSV back-filled.
+    """
+
+    def __init__(self, students_path=STUDENTS_PATH, sessions_path=SESSIONS_PATH):
+        self.students_path = students_path
+        self.sessions_path = sessions_path
+        self.students = []
+        self.student_index = {}
+        self._load_students()
+
+    @classmethod
+    def open(cls, students_path=STUDENTS_PATH, sessions_path=SESSIONS_PATH,
+             legacy_path=LEGACY_CSV_PATH):
+        """Open the store, importing the legacy wide CSV the first time"""
+        store = cls(students_path, sessions_path)
+        if not os.path.exists(sessions_path) and os.path.exists(legacy_path):
+            store.migrate_csv(legacy_path)
+        return store
+
+    def _load_students(self):
+        if not os.path.exists(self.students_path):
+            return
+        with open(self.students_path, "r", newline="") as f:
+            rows = list(csv.reader(f))
+        for row in rows[1:]:
+            if row and row[0] not in self.student_index:
+                self.student_index[row[0]] = len(self.students)
+                self.students.append(row[0])
+
+    def _append(self, path, header, rows):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        is_new = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(header)
+            writer.writerows(rows)
+
+    def add_students(self, names):
+        """Append any names not yet on the roster"""
+        new = []
+        for name in names:
+            if name not in self.student_index:
+                self.student_index[name] = len(self.students)
+                self.students.append(name)
+                new.append([name])
+        if new or not os.path.exists(self.students_path):
+            self._append(self.students_path, ["Student"], new)
+
+    def add_student(self, name):
+        self.add_students([name])
+
+    def record_session(self, day, section, present_students):
+        """Append one session; unknown present students are added to the roster"""
+        # Sorted so a new student's column position doesn't depend on set order
+        self.add_students(sorted(present_students))
+        present = encode_present(self.student_index[name] for name in present_students)
+        self._append(self.sessions_path, ["Date", "Section", "Present"],
+                     [[str(day), section, present]])
+
+    def session_masks(self):
+        """Yield raw (date, section, hex bitset) rows in recorded order"""
+        if not os.path.exists(self.sessions_path):
+            return
+        with open(self.sessions_path, "r", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if not row:
+                    continue
+                section = row[1] if len(row) > 1 else "Unknown"
+                yield row[0], section, row[2] if len(row) > 2 else ""
+
+    def sessions(self):
+        """Yield (date, section, present index list) in recorded order"""
+        for day, section, mask_hex in self.session_masks():
+            yield day, section, decode_present(mask_hex)
+
+    def to_rows(self):
+        """Header and rows in the legacy wide Date,Section,<student>... format"""
+        header = ["Date", "Section"] + self.students
+        rows = []
+        for day, section, present in self.sessions():
+            marks = ["A"] * len(self.students)
+            for i in present:
+                if i < len(marks):
+                    marks[i] = "P"
+            rows.append([day, section] + marks)
+        return header, rows
+
+    def export_csv(self, path=LEGACY_CSV_PATH):
+        """Write the whole log out as the wide CSV the app used to keep"""
+        header, rows = self.to_rows()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def migrate_csv(self, legacy_path=LEGACY_CSV_PATH):
+        """One-time import of the wide CSV; the original file is left in place"""
+        with open(legacy_path, "r", newline="") as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            return
+
+        header = rows[0]
+        has_section = len(header) > 1 and header[1] == "Section"
+        start_idx = 2 if has_section else 1
+        students = header[start_idx:]
+        self.add_students(students)
+
+        sessions = []
+        for row in rows[1:]:
+            if not row:
+                continue
+            section = row[1] if has_section and len(row) > 1 else "Unknown"
+            present = [self.student_index[name]
+                       for name, mark in zip(students, row[start_idx:]) if mark == "P"]
+            sessions.append([row[0], section, encode_present(present)])
+        self._append(self.sessions_path, ["Date", "Section", "Present"], sessions)
+
+
+class AttendanceIndex:
+    """Parsed view of the store: a student x session presence matrix plus row lookups"""
+
+    def __init__(self, store):
+        self.students = list(store.students)
+        self.student_index = {name: i for i, name in enumerate(self.students)}
+        self.dates = []
+        self.sections = []
+        self.by_date = {}  # date string -> session indexes
+        self.by_section = {}  # section -> session indexes
+
+        masks = []
+        for i, (day, section, mask_hex) in enumerate(store.session_masks()):
+            self.dates.append(day)
+            self.sections.append(section)
+            self.by_date.setdefault(day, []).append(i)
+            self.by_section.setdefault(section, []).append(i)
+            masks.append(int(mask_hex or "0", 16))
+
+        n_students = len(self.students)
+        nbytes = (n_students + 7) // 8
+        packed = np.zeros((len(masks), nbytes), dtype=np.uint8)
+        for i, mask in enumerate(masks):
+            mask &= (1 << n_students) - 1
+            packed[i] = np.frombuffer(mask.to_bytes(nbytes, "little"), dtype=np.uint8)
+        bits = np.unpackbits(packed, axis=1, bitorder="little")[:, :n_students]
+        # presence[student, session] is True when the student was marked present
+        self.presence = np.ascontiguousarray(bits.T.astype(bool))
+
+        # Proleptic ordinals for date-range filters; -1 marks unparseable dates
+        self.ordinals = np.full(len(self.dates), -1, dtype=np.int64)
+        for day, sessions in self.by_date.items():
+            try:
+                self.ordinals[sessions] = datetime.strptime(day, "%Y-%m-%d").date().toordinal()
+            except ValueError:
+                continue
+
+        self.summary = None  # Per-student counts, filled by csv_utils.get_attendance_summary
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def header(self):
+        return ["Date", "Section"] + self.students
+
+    def present_counts(self, sessions=None):
+        """Number of present students in each (selected) session"""
+        if sessions is None:
+            return self.presence.sum(axis=0)
+        return self.presence[:, sessions].sum(axis=0)
+
+    def rows(self, sessions=None):
+        """Wide Date,Section,<student>... rows for the (selected) sessions
+
+        Built on every call and not kept: at thousands of students the string
+        matrix is far larger than the presence bits it is made from.
+        """
+        if sessions is None:
+            sessions = range(len(self.dates))
+        sessions = list(sessions)
+        marks = np.where(self.presence[:, sessions].T, "P", "A").tolist()
+        return [[self.dates[i], self.sections[i]] + row for i, row in zip(sessions, marks)]
+
+    def sessions_between(self, start_date=None, end_date=None, section=None):
+        """Indexes of sessions with a valid date inside [start, end] and optional section"""
+        selected = self.ordinals >= 0
+        if start_date:
+            selected &= self.ordinals >= start_date.toordinal()
+        if end_date:
+            selected &= self.ordinals <= end_date.toordinal()
+        if section and section != "All":
+            in_section = np.zeros(len(self.dates), dtype=bool)
+            in_section[self.by_section.get(section, [])] = True
+            selected &= in_section
+        return np.flatnonzero(selected).tolist()
@@ -1,222 +1,153 @@
-import csv
 import os
-from datetime import date, datetime, timedelta
+import threading
+from datetime import date, timedelta
 
-CSV_PATH = "data/attendance.csv"
+from utils.attendance_store import (
+    AttendanceStore, AttendanceIndex, STUDENTS_PATH, SESSIONS_PATH
+)
+from utils.metrics import span
 
+CSV_PATH = "data/attendance.csv"  # Wide-format export; the live data is the append-only store
 
-def init_csv(student_name):
-    """Initialize CSV file with headers"""
-    if not os.path.exists(CSV_PATH):
-        os.makedirs(os.path.dirname(CSV_PATH), exist_ok=True)
-        with open(CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Date", "Section", student_name])
-
-
-def add_student_column(student_name):
-    """Add a new student column to the CSV"""
-    if not os.path.exists(CSV_PATH):
-        init_csv(student_name)
-        return
+# One parsed index shared by every query function
+_index_lock = threading.Lock()
+_index_cache = {"signature": None, "index": None}
 
-    with open(CSV_PATH, "r") as f:
-        rows = list(csv.reader(f))
 
-    if not rows:
-        init_csv(student_name)
-        return
+def open_store():
+    """Open the attendance store, migrating CSV_PATH on first use"""
+    return AttendanceStore.open(legacy_path=CSV_PATH)
 
-    # Check if Section column exists, if not add it
-    if len(rows[0]) > 0 and rows[0][1] != "Section":
-        # Old format - need to migrate
-        rows[0].insert(1, "Section")
-        for i in range(1, len(rows)):
-            rows[i].insert(1, "Unknown")
 
-    if student_name in rows[0]:
-        return
+def init_csv(student_name):
+    """Initialize the attendance store with its first student"""
+    open_store().add_student(student_name)
 
-    rows[0].append(student_name)
-    for i in range(1, len(rows)):
-        rows[i].append("A")
 
-    with open(CSV_PATH, "w", newline="") as f:
-        csv.writer(f).writerows(rows)
+def add_student_column(student_name):
+    """Add a new student to the roster (history is not rewritten)"""
+    with span("roster_write"):
+        open_store().add_student(student_name)
 
 
 def mark_attendance(present_students, section="Unknown"):
     """Mark attendance for present students with section info"""
-    today = str(date.today())
-    os.makedirs(os.path.dirname(CSV_PATH), exist_ok=True)
-
-    if not os.path.exists(CSV_PATH):
-        with open(CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            header = ["Date", "Section"] + list(present_students)
-            writer.writerow(header)
-        return
+    with span("attendance_write"):
+        open_store().record_session(date.today(), section, present_students)
 
-    with open(CSV_PATH, "r") as f:
-        rows = list(csv.reader(f))
 
-    if not rows:
-        with open(CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            header = ["Date", "Section"] + list(present_students)
-            writer.writerow(header)
-        return
+def export_attendance_csv(path=CSV_PATH):
+    """Export all attendance in the wide Date,Section,<student>... CSV format"""
+    open_store().export_csv(path)
+    return path
 
-    header = rows[0]
 
-    # Check if Section column exists, if not add it
-    if len(header) > 1 and header[1] != "Section":
-        header.insert(1, "Section")
-        for i in range(1, len(rows)):
-            rows[i].insert(1, "Unknown")
-
-    # Ensure Section column exists
-    if "Section" not in header:
-        header.insert(1, "Section")
-        for i in range(1, len(rows)):
-            rows[i].insert(1, "Unknown")
-
-    # Add any new students to the header
-    for student in present_students:
-        if student not in header:
-            header.append(student)
-            for i in range(1, len(rows)):
-                rows[i].append("A")
-
-    rows[0] = header
-
-    new_row = [today, section]
-    for name in header[2:]:  # Skip Date and Section columns
-        new_row.append("P" if name in present_students else "A")
-
-    rows.append(new_row)
-
-    with open(CSV_PATH, "w", newline="") as f:
-        csv.writer(f).writerows(rows)
+def attendance_signature():
+    """(mtime, size) of both store files; any append changes it"""
+    signature = []
+    for path in (STUDENTS_PATH, SESSIONS_PATH):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_attendance_index():
+    """Shared AttendanceIndex, reparsed only when the store files change"""
+    with _index_lock:
+        signature = attendance_signature()
+        if _index_cache["index"] is None or _index_cache["signature"] != signature:
+            with span("attendance_index"):
+                store = open_store()
+                # Migration may have just created the files, so take the signature afterwards
+                _index_cache["signature"] = attendance_signature()
+                _index_cache["index"] = AttendanceIndex(store)
+        return _index_cache["index"]
 
 
 def get_attendance_data():
-    """Get all attendance data from CSV"""
-    if not os.path.exists(CSV_PATH):
-        return [], []
-
-    with open(CSV_PATH, "r") as f:
-        reader = csv.reader(f)
-        rows = list(reader)
+    """Get all attendance data as wide header and rows"""
+    index = get_attendance_index()
 
-    if len(rows) < 2:
+    if len(index) == 0:
         return [], []
 
-    header = rows[0]
-    data = rows[1:]
-
-    return header, data
+    return index.header, index.rows()
 
 
 def get_students_list():
-    """Get list of all enrolled students from CSV header"""
-    header, _ = get_attendance_data()
-    if not header:
+    """Get list of all enrolled students"""
+    index = get_attendance_index()
+    if len(index) == 0:
         return []
 
-    # Check if Section column exists
-    has_section = len(header) > 1 and header[1] == "Section"
-    start_idx = 2 if has_section else 1
-
-    if len(header) > start_idx:
-        return header[start_idx:]
-    return []
+    return list(index.students)
 
 
 def get_attendance_by_section(section=None):
     """Get attendance data filtered by section"""
-    header, data = get_attendance_data()
-    if not data:
-        return header, []
+    index = get_attendance_index()
+    if len(index) == 0:
+        return [], []
 
     if section and section != "All":
-        # Ensure Section column exists
-        section_idx = 1 if len(header) > 1 and header[1] == "Section" else -1
-        if section_idx >= 0:
-            data = [row for row in data if len(
-                row) > section_idx and row[section_idx] == section]
+        return index.header, index.rows(index.by_section.get(section, []))
 
-    return header, data
+    return index.header, index.rows()
 
 
 def get_attendance_by_date_range(start_date=None, end_date=None, section=None):
     """Get attendance data within a date range and optionally filtered by section"""
-    header, data = get_attendance_data()
-    if not data:
-        return header, []
-
-    filtered_data = []
-    for row in data:
-        if not row:
-            continue
-
-        row_date = row[0]
-        try:
-            row_date_obj = datetime.strptime(row_date, "%Y-%m-%d").date()
-        except ValueError:
-            continue
-
-        # Date filter
-        if start_date and row_date_obj < start_date:
-            continue
-        if end_date and row_date_obj > end_date:
-            continue
-
-        # Section filter
-        if section and section != "All":
-            section_idx = 1 if len(
-                header) > 1 and header[1] == "Section" else -1
-            if section_idx >= 0 and len(row) > section_idx:
-                if row[section_idx] != section:
-                    continue
-
-        filtered_data.append(row)
+    index = get_attendance_index()
+    if len(index) == 0:
+        return [], []
 
-    return header, filtered_data
+    sessions = index.sessions_between(start_date, end_date, section)
+    return index.header, index.rows(sessions)
 
 
 def get_student_attendance_rate(student_name):
     """Calculate attendance rate for a specific student"""
-    header, data = get_attendance_data()
-    if not data or student_name not in header:
+    index = get_attendance_index()
+    if len(index) == 0 or student_name not in index.student_index:
         return 0.0
 
-    student_idx = header.index(student_name)
-    total = len(data)
-    present = sum(1 for row in data if len(row) >
-                  student_idx and row[student_idx] == "P")
+    present = int(index.presence[index.student_index[student_name]].sum())
+    return present / len(index) * 100
 
-    return (present / total * 100) if total > 0 else 0.0
 
+def get_attendance_summary():
+    """Present count, session total and rate for every student from one pass over the index
 
-def get_all_student_attendance_rates():
-    """Get attendance rates for all students"""
-    header, data = get_attendance_data()
-    if not data:
+    Returns {student: {"present": int, "total": int, "rate": float}}.
+    """
+    index = get_attendance_index()
+    if len(index) == 0:
         return {}
 
-    # Check if Section column exists
-    has_section = len(header) > 1 and header[1] == "Section"
+    with _index_lock:
+        if index.summary is None:
+            total = len(index)
+            present = index.presence.sum(axis=1).tolist()
+            index.summary = {
+                student: {"present": count, "total": total, "rate": count / total * 100}
+                for student, count in zip(index.students, present)
+            }
+    return {student: dict(stats) for student, stats in index.summary.items()}
+
 
-    # Skip Date and Section columns if present
-    start_idx = 2 if has_section else 1
-    students = header[start_idx:] if len(header) > start_idx else []
-    rates = {}
+def get_attendance_totals():
+    """(present marks, absent marks) over every student and session, straight from the index"""
+    index = get_attendance_index()
+    present = int(index.presence.sum())
+    return present, index.presence.size - present
 
-    for student in students:
-        rates[student] = get_student_attendance_rate(student)
 
-    return rates
+def get_all_student_attendance_rates():
+    """Get attendance rates for all students"""
+    return {student: stats["rate"] for student, stats in get_attendance_summary().items()}
 
 
 def get_low_attendance_students(threshold=75.0):
@@ -230,139 +161,77 @@ def get_daily_attendance_counts(days=7, section=None):
     today = date.today()
     start_date = today - timedelta(days=days - 1)
 
-    header, data = get_attendance_by_date_range(start_date, today, section)
-
-    # Check if Section column exists
-    has_section = len(header) > 1 and header[1] == "Section"
-    start_idx = 2 if has_section else 1
+    index = get_attendance_index()
+    students = index.students if len(index) else []
 
     daily_counts = {}
-    students = header[start_idx:] if len(header) > start_idx else []
-
     for i in range(days):
         day = start_date + timedelta(days=i)
         day_str = str(day)
         daily_counts[day_str] = {"present": 0,
                                  "absent": 0, "total": len(students)}
 
-    for row in data:
-        if not row:
-            continue
-        row_date = row[0]
+    sessions = index.sessions_between(start_date, today, section)
+    for session, present in zip(sessions, index.present_counts(sessions)):
+        row_date = index.dates[session]
         if row_date in daily_counts:
-            present = row[start_idx:].count("P") if len(row) > start_idx else 0
-            absent = row[start_idx:].count("A") if len(row) > start_idx else 0
-            daily_counts[row_date]["present"] += present
-            daily_counts[row_date]["absent"] += absent
+            daily_counts[row_date]["present"] += int(present)
+            daily_counts[row_date]["absent"] += len(students) - int(present)
 
     return daily_counts
 
 
 def get_section_comparison():
     """Compare attendance between sections"""
-    header, data = get_attendance_data()
-    if not data:
+    index = get_attendance_index()
+    if len(index) == 0:
         return {}
 
     section_stats = {}
-    section_idx = 1 if len(header) > 1 and header[1] == "Section" else -1
-
-    if section_idx < 0:
-        return {}
-
-    for row in data:
-        if len(row) <= section_idx:
-            continue
-
-        section = row[section_idx]
-        if section not in section_stats:
-            section_stats[section] = {"present": 0, "total": 0}
-
-        present = row[2:].count("P") if len(row) > 2 else 0
-        total = len(row) - 2 if len(row) > 2 else 0
-
-        section_stats[section]["present"] += present
-        section_stats[section]["total"] += total
+    for section, sessions in index.by_section.items():
+        section_stats[section] = {
+            "present": int(index.present_counts(sessions).sum()),
+            "total": len(index.students) * len(sessions),
+        }
 
     return section_stats
 
 
 def get_today_attendance_by_section():
     """Get today's attendance grouped by section (or most recent date if no data for today)"""
-    today = str(date.today())
-    header, data = get_attendance_data()
-
-    if not data:
+    index = get_attendance_index()
+    if len(index) == 0:
         return {}
 
-    # Check if Section column exists
-    has_section = len(header) > 1 and header[1] == "Section"
-
-    # Find the most recent date in the data
-    most_recent_date = None
-    for row in data:
-        if row and row[0]:
-            try:
-                row_date = datetime.strptime(row[0], "%Y-%m-%d").date()
-                if most_recent_date is None or row_date > most_recent_date:
-                    most_recent_date = row_date
-            except ValueError:
-                continue
-
-    # Use today if available, otherwise use most recent date
-    target_date = str(today) if most_recent_date and most_recent_date == date.today(
-    ) else (str(most_recent_date) if most_recent_date else today)
+    # Use the most recent date in the data (today when there is data for today)
+    valid = index.ordinals[index.ordinals >= 0]
+    target_date = str(date.fromordinal(int(valid.max()))) if len(valid) else str(date.today())
 
+    sessions = index.by_date.get(target_date, [])
     section_attendance = {}
 
-    for row in data:
-        if not row or row[0] != target_date:
-            continue
-
-        if has_section:
-            section = row[1] if len(row) > 1 else "Unknown"
-            present = row[2:].count("P") if len(row) > 2 else 0
-        else:
-            # Old format without Section column
-            section = "Legacy Data"
-            present = row[1:].count("P") if len(row) > 1 else 0
-
-        if section not in section_attendance:
-            section_attendance[section] = 0
-        section_attendance[section] += present
+    for session, present in zip(sessions, index.present_counts(sessions)):
+        section = index.sections[session]
+        section_attendance[section] = section_attendance.get(section, 0) + int(present)
 
     return section_attendance
 
 
 def get_recent_activities(limit=5):
     """Get recent attendance activities with section info, grouped by date"""
-    header, data = get_attendance_data()
-    if not data:
+    index = get_attendance_index()
+    if len(index) == 0:
         return []
 
-    # Check if Section column exists
-    has_section = len(header) > 1 and header[1] == "Section"
-
     # Group by date and section
     date_section_map = {}
 
-    for row in data:
-        if not row or not row[0]:
+    for day, section, present in zip(index.dates, index.sections, index.present_counts()):
+        if not day:
             continue
 
-        date_str = row[0]
-
-        if has_section:
-            section = row[1] if len(row) > 1 else "Unknown"
-            present = row[2:].count("P") if len(row) > 2 else 0
-        else:
-            section = "All Sections"
-            present = row[1:].count("P") if len(row) > 1 else 0
-
-        key = (date_str, section)
-        if key not in date_section_map:
-            date_section_map[key] = 0
-        date_section_map[key] += present
+        key = (day, section)
+        date_section_map[key] = date_section_map.get(key, 0) + int(present)
 
     # Convert to list and sort by date (most recent first)
     activities = []
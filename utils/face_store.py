@@ -0,0 +1,261 @@
+# utils/face_store.py
+import json
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+
+from utils.face_utils import FaceGallery, SectionGallery
+from utils.ann_index import index_gallery
+from utils.metrics import span
+
+FACE_DB_PATH = "face_db.pkl"  # Legacy pickled {name: [embedding, ...]} dict, migrated once
+STORE_DIR = "face_store"
+EMBEDDINGS_FILE = "embeddings.f32"  # Raw float32 rows, appended in place
+INDEX_FILE = "index.json"  # Identity -> row range, rewritten atomically
+EMBEDDING_DIM = 512
+SECTION_FALLBACK = True  # Faces unknown in the section's roster are retried against everyone
+
+# Process-wide store and gallery shared by every page, keyed by store path
+_cache_lock = threading.RLock()
+_cache = {}
+
+
+class FaceStore:
+    """Append-only embedding store: a memory-mapped float32 matrix plus a small identity index
+
+    Every reader maps the same file, so the OS page cache is shared instead of
+    each page unpickling its own copy of the database.
+    """
+
+    def __init__(self, path=STORE_DIR, dim=EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self.embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.rows = 0
+        self.identities = {}  # name -> (start row, row count)
+        self.sections = {}  # name -> sections the student is enrolled in
+        self._matrix = None
+        self._load_index()
+
+    @classmethod
+    def open(cls, path=STORE_DIR, legacy_path=FACE_DB_PATH):
+        """Open the store, importing the legacy pickle the first time"""
+        store = cls(path)
+        if not os.path.exists(store.index_path) and os.path.exists(legacy_path):
+            store.migrate_pickle(legacy_path)
+        return store
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r") as f:
+            index = json.load(f)
+        self.dim = index.get("dim", self.dim)
+        self.rows = index.get("rows", 0)
+        self.identities = {
+            entry["name"]: (entry["start"], entry["count"])
+            for entry in index.get("identities", [])
+        }
+        self.sections = {
+            entry["name"]: entry["sections"]
+            for entry in index.get("identities", []) if entry.get("sections")
+        }
+
+    def _write_index(self):
+        identities = []
+        for name, (start, count) in self.identities.items():
+            entry = {"name": name, "start": start, "count": count}
+            if self.sections.get(name):
+                entry["sections"] = self.sections[name]
+            identities.append(entry)
+        index = {"dim": self.dim, "rows": self.rows, "identities": identities}
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def __len__(self):
+        return len(self.identities)
+
+    def __contains__(self, name):
+        return name in self.identities
+
+    @property
+    def names(self):
+        return list(self.identities.keys())
+
+    def matrix(self):
+        """Read-only memory map over every stored row"""
+        if self.rows == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self._matrix is None or self._matrix.shape[0] != self.rows:
+            self._matrix = np.memmap(self.embeddings_path, dtype=np.float32,
+                                     mode="r", shape=(self.rows, self.dim))
+        return self._matrix
+
+    def embeddings(self, name):
+        start, count = self.identities[name]
+        return self.matrix()[start:start + count]
+
+    def roster(self, section):
+        """Names enrolled in a section; students enrolled before sections were recorded are in every roster"""
+        return [name for name in self.identities
+                if section in self.sections.get(name, ()) or not self.sections.get(name)]
+
+    def add(self, name, embeddings, sections=None):
+        """Append embeddings for one identity; re-adding a name replaces its rows
+
+        sections records section membership; None keeps what was recorded before.
+        """
+        block = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        os.makedirs(self.path, exist_ok=True)
+
+        # Write at the end of the indexed rows so a torn append is simply overwritten
+        mode = "r+b" if os.path.exists(self.embeddings_path) else "wb"
+        with open(self.embeddings_path, mode) as f:
+            f.seek(self.rows * self.dim * 4)
+            f.write(block.tobytes())
+            f.truncate()
+
+        self.identities.pop(name, None)
+        self.identities[name] = (self.rows, len(block))
+        self.rows += len(block)
+        if sections is not None:
+            self.sections[name] = list(sections)
+        self._write_index()
+        _update_cache(self, name, block)
+
+    def migrate_pickle(self, legacy_path=FACE_DB_PATH):
+        """One-time import of the old face_db.pkl; the pickle is left untouched
+
+        All students are written as one block into a temporary directory that
+        is renamed into place, so an interrupted import leaves no index behind
+        and is simply retried on the next open.
+        """
+        with open(legacy_path, "rb") as f:
+            face_db = pickle.load(f)
+
+        blocks = []
+        identities = {}
+        rows = 0
+        for name, embeddings in face_db.items():
+            if len(embeddings):
+                block = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+                identities[name] = (rows, len(block))
+                rows += len(block)
+                blocks.append(block)
+
+        tmp_dir = self.path.rstrip(os.sep) + ".migrating"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        staged = FaceStore(tmp_dir, self.dim)
+        with open(staged.embeddings_path, "wb") as f:
+            for block in blocks:
+                f.write(block.tobytes())
+        staged.rows = rows
+        staged.identities = identities
+        staged._write_index()
+
+        # Without an index nothing in path is usable (at most a torn append)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(tmp_dir, self.path)
+        self._matrix = None
+        self._load_index()
+
+    def to_face_db(self):
+        """Legacy {name: [embedding, ...]} view over the mapped rows"""
+        return {name: list(self.embeddings(name)) for name in self.identities}
+
+    def to_gallery(self):
+        """FaceGallery over the mapped matrix (zero-copy unless replaced rows must be skipped)"""
+        if not self.identities:
+            return FaceGallery()
+
+        names = self.names
+        labels = np.full(self.rows, -1, dtype=np.int64)
+        for i, (start, count) in enumerate(self.identities.values()):
+            labels[start:start + count] = i
+
+        matrix = self.matrix()
+        live = labels >= 0
+        if not live.all():
+            matrix = matrix[live]
+            labels = labels[live]
+        return FaceGallery(names, matrix, labels)
+
+
+def store_signature(path=STORE_DIR):
+    """(mtime, size) of the index, which is replaced on every append"""
+    try:
+        st = os.stat(os.path.join(path, INDEX_FILE))
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _cached_entry(path):
+    with _cache_lock:
+        entry = _cache.get(path)
+        signature = store_signature(path)
+        if entry is None or entry["signature"] != signature or signature is None:
+            with span("store_open"):
+                store = FaceStore.open(path)
+            entry = {"signature": store_signature(path), "store": store, "gallery": None,
+                     "section_galleries": {}}
+            _cache[path] = entry
+        return entry
+
+
+def _update_cache(store, name, block):
+    """Fold an append into the shared gallery instead of reloading it"""
+    with _cache_lock:
+        entry = _cache.get(store.path)
+        if entry is None:
+            return
+        if entry["store"] is not store:
+            # Appended through another handle; mirror the new index in place
+            cached = entry["store"]
+            cached.rows = store.rows
+            cached.identities = dict(store.identities)
+            cached.sections = dict(store.sections)
+        entry["section_galleries"] = {}
+        if entry["gallery"] is not None:
+            # New rows join the existing IVF lists; retrains only once the gallery has grown a lot
+            entry["gallery"] = index_gallery(entry["gallery"].with_identity(name, block))
+        entry["signature"] = store_signature(store.path)
+
+
+def get_store(path=STORE_DIR):
+    """Shared FaceStore, reopened only when the index file's mtime or size changes"""
+    return _cached_entry(path)["store"]
+
+
+def get_gallery(path=STORE_DIR):
+    """Shared FaceGallery, rebuilt only when the store changed on disk
+
+    Galleries of ANN_MIN_ROWS rows or more carry an IVF index for approximate search.
+    """
+    with _cache_lock:
+        entry = _cached_entry(path)
+        if entry["gallery"] is None:
+            with span("gallery_build"):
+                entry["gallery"] = index_gallery(entry["store"].to_gallery())
+        return entry["gallery"]
+
+
+def get_section_gallery(section, path=STORE_DIR, fallback=SECTION_FALLBACK):
+    """Gallery that matches against the section's roster first, cached per section"""
+    with _cache_lock:
+        gallery = get_gallery(path)
+        entry = _cached_entry(path)
+        key = (section, fallback)
+        scoped = entry["section_galleries"].get(key)
+        if scoped is None or scoped.full is not gallery:
+            roster = index_gallery(gallery.subset(entry["store"].roster(section)))
+            scoped = SectionGallery(roster, gallery, fallback)
+            entry["section_galleries"][key] = scoped
+        return scoped
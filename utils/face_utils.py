@@ -1,13 +1,298 @@
 # utils/face_utils.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
-from ultralytics import YOLO
-from keras_facenet import FaceNet
+import numpy as np
 from numpy.linalg import norm
 
-yolo = YOLO("model.pt")
-embedder = FaceNet()
+from utils.ann_index import ANN_NPROBE, ANN_RERANK_K, kmeans
+from utils.metrics import span, incr
 
+YOLO_WEIGHTS = "model.pt"
 THRESHOLD = 0.8  # Balanced threshold for group photos (0.6 too strict, 1.0 too permissive)
+EMBED_BATCH_SIZE = 32  # Faces per FaceNet forward pass
+DECODE_WORKERS = 4  # Threads used to decode image files (cv2.imread releases the GIL)
+WARM_UP_MODELS = True  # Run dummy inputs through both models shortly after startup
+WARMUP_IMAGE_SIZE = (720, 1280)  # (height, width) of a typical classroom photo
+PROTOTYPE_METHOD = "kmeans"  # How enrollment embeddings are kept: "kmeans", "dedup", "all" or "mean"
+MAX_PROTOTYPES = 5  # Gallery rows stored per student
+DEDUP_DISTANCE = 0.35  # "dedup" drops embeddings closer than this to one already kept
+
+logger = logging.getLogger(__name__)
+
+# Models are loaded on first use so importing this module (and opening the
+# window) doesn't pay for TensorFlow and ultralytics
+_models = {}
+_model_locks = {"yolo": threading.Lock(), "facenet": threading.Lock()}
+# Held around every forward pass: neither ultralytics predictors nor the Keras
+# model may be called from two threads at once (warm-up, attendance, enrollment)
+_inference_locks = {"yolo": threading.Lock(), "facenet": threading.Lock()}
+_warming_up = threading.Event()
+
+
+def get_yolo():
+    """Shared YOLO face detector, loaded on first call"""
+    model = _models.get("yolo")
+    if model is None:
+        with _model_locks["yolo"]:
+            model = _models.get("yolo")
+            if model is None:
+                with span("load_yolo"):
+                    from ultralytics import YOLO
+                    model = _models["yolo"] = YOLO(YOLO_WEIGHTS)
+    return model
+
+
+def get_embedder():
+    """Shared FaceNet embedder, loaded on first call"""
+    model = _models.get("facenet")
+    if model is None:
+        with _model_locks["facenet"]:
+            model = _models.get("facenet")
+            if model is None:
+                with span("load_facenet"):
+                    from keras_facenet import FaceNet
+                    model = _models["facenet"] = FaceNet()
+    return model
+
+
+def models_loaded():
+    return "yolo" in _models and "facenet" in _models
+
+
+def models_warming_up():
+    """True while warm_up_models() runs; inference waits for it on the model locks"""
+    return _warming_up.is_set()
+
+
+def load_models():
+    """Load both models now (blocking)"""
+    get_yolo()
+    get_embedder()
+
+
+def warm_up_models(batch_size=EMBED_BATCH_SIZE):
+    """Load both models and push dummy inputs through them
+
+    The first real photo then skips TensorFlow graph tracing and YOLO's
+    first-inference setup and runs at steady-state latency.
+    """
+    _warming_up.set()
+    try:
+        _warm_up(batch_size)
+    finally:
+        _warming_up.clear()
+
+
+def _warm_up(batch_size):
+    load_models()
+    # Holding the inference locks makes a photo that arrives mid-warm-up wait
+    # for it instead of sharing the models with it
+    dummy_photo = np.zeros((*WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)
+    with _inference_locks["yolo"]:
+        get_yolo()(dummy_photo, verbose=False)
+
+    # A full mini-batch and a single face cover both shapes FaceNet sees in practice
+    dummy_faces = np.zeros((max(1, int(batch_size)), 160, 160, 3), dtype=np.uint8)
+    with _inference_locks["facenet"]:
+        get_embedder().embeddings(dummy_faces)
+        get_embedder().embeddings(dummy_faces[:1])
+
+
+class FaceGallery:
+    """All enrolled embeddings in one contiguous float32 matrix for vectorized matching"""
+
+    def __init__(self, names=None, matrix=None, labels=None, ann=None):
+        self.names = list(names or [])
+        if matrix is None:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if labels is None:
+            labels = np.empty(0, dtype=np.int64)
+        # labels[i] is the index into self.names of the identity owning row i
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        # Optional IVFIndex over the rows (see utils.ann_index); None means exact scan
+        self.ann = ann
+        self.nprobe = ANN_NPROBE
+        self.rerank_k = ANN_RERANK_K
+
+    @classmethod
+    def from_face_db(cls, face_db):
+        """Build a gallery from a {name: [embedding, ...]} dict"""
+        names = []
+        rows = []
+        labels = []
+        for name, embeddings in face_db.items():
+            names.append(name)
+            for emb in embeddings:
+                rows.append(np.asarray(emb, dtype=np.float32).ravel())
+                labels.append(len(names) - 1)
+
+        if not rows:
+            return cls(names)
+        return cls(names, np.vstack(rows), labels)
+
+    def __len__(self):
+        return len(self.names)
+
+    def with_identity(self, name, embeddings):
+        """New gallery with one identity added (or its rows replaced); self is left untouched
+
+        Copy-on-write keeps galleries handed to running workers consistent.
+        """
+        block = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        names = list(self.names)
+        matrix, labels = self.matrix, self.labels
+        keep = np.ones(len(labels), dtype=bool)
+
+        if name in names:
+            idx = names.index(name)
+            keep = labels != idx
+            matrix, labels = matrix[keep], labels[keep]
+            del names[idx]
+            labels = np.where(labels > idx, labels - 1, labels)
+
+        names.append(name)
+        if matrix.size == 0:
+            matrix = np.empty((0, block.shape[1]), dtype=np.float32)
+        labels = np.concatenate(
+            [labels, np.full(len(block), len(names) - 1, dtype=np.int64)])
+        ann = self.ann.with_rows(keep, block) if self.ann is not None else None
+        return FaceGallery(names, np.vstack([matrix, block]), labels, ann)
+
+    def subset(self, names):
+        """New gallery holding only the given identities (unknown names are ignored)"""
+        wanted = [self.names.index(name) for name in names if name in self.names]
+        if not wanted:
+            return FaceGallery()
+        remap = np.full(len(self.names), -1, dtype=np.int64)
+        remap[wanted] = np.arange(len(wanted))
+        rows = np.flatnonzero(remap[self.labels] >= 0)
+        return FaceGallery([self.names[i] for i in wanted], self.matrix[rows],
+                           remap[self.labels[rows]])
+
+    def distances(self, embeddings):
+        """Euclidean distance from each query (rows) to every gallery embedding (columns)"""
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        sq = q_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq), queries
+
+    def identity_distances(self, embedding):
+        """Minimum distance to each enrolled name for one query"""
+        per_name = {name: float("inf") for name in self.names}
+        if self.matrix.size == 0:
+            return per_name
+
+        dists, _ = self.distances(embedding)
+        # Students can have several prototype rows; keep the closest per name
+        best = np.full(len(self.names), np.inf)
+        np.minimum.at(best, self.labels, dists[0])
+        return {name: float(dist) for name, dist in zip(self.names, best)}
+
+    def nearest_rows(self, queries):
+        """Row of the nearest gallery embedding per query, via the ANN index when present"""
+        if self.ann is None:
+            dists, _ = self.distances(queries)
+            return np.argmin(dists, axis=1)
+
+        # Scan list by list so every query probing a list shares one matrix product
+        k = min(self.rerank_k, len(self.matrix))
+        top_sq = np.full((len(queries), k), np.inf, dtype=np.float32)
+        top_rows = np.zeros((len(queries), k), dtype=np.int64)
+        probes = self.ann.nearest_lists(queries, self.nprobe)
+        for c in np.unique(probes):
+            rows = self.ann.list_rows(c)
+            if len(rows) == 0:
+                continue
+            qi = np.flatnonzero((probes == c).any(axis=1))
+            sq = self.sq_norms[rows][None, :] - 2.0 * (queries[qi] @ self.matrix[rows].T)
+            merged_sq = np.hstack([top_sq[qi], sq])
+            merged_rows = np.hstack([top_rows[qi], np.broadcast_to(rows, sq.shape)])
+            keep = np.argpartition(merged_sq, k - 1, axis=1)[:, :k]
+            top_sq[qi] = np.take_along_axis(merged_sq, keep, axis=1)
+            top_rows[qi] = np.take_along_axis(merged_rows, keep, axis=1)
+
+        # Re-rank the top-k candidates exactly so rounding can't flip the winner
+        best = np.empty(len(queries), dtype=np.int64)
+        for i, query in enumerate(queries):
+            top = top_rows[i][np.isfinite(top_sq[i])]
+            if len(top) == 0:
+                top = np.arange(len(self.matrix))
+            best[i] = top[np.argmin(norm(self.matrix[top] - query, axis=1))]
+        return best
+
+    def match(self, embeddings, threshold=THRESHOLD):
+        """Return a (name, distance) pair per query, "Unknown" when above threshold"""
+        with span("match"):
+            matches = self._match(embeddings, threshold)
+        incr("match_queries", len(matches))
+        return matches
+
+    def _match(self, embeddings, threshold):
+        # Uninstrumented, so wrappers that search several galleries time each query once
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if self.matrix.size == 0:
+            return [("Unknown", float("inf")) for _ in range(len(queries))]
+
+        best_rows = self.nearest_rows(queries)
+        matches = []
+        for query, row in zip(queries, best_rows):
+            # Recompute the winner exactly so reported distances match norm(a - b)
+            dist = float(norm(query - self.matrix[row]))
+            name = self.names[self.labels[row]]
+            if dist <= threshold:
+                matches.append((name, dist))
+            else:
+                matches.append(("Unknown", dist))
+        return matches
+
+
+class SectionGallery:
+    """Matches against one section's roster first, optionally retrying unknown faces on everyone
+
+    Searching only the section keeps matching cheap on a large campus and
+    stops look-alikes from other sections winning a close call.
+    """
+
+    def __init__(self, roster, full, fallback=True):
+        self.roster = roster
+        self.full = full
+        self.fallback = fallback
+
+    @property
+    def names(self):
+        return self.full.names
+
+    def __len__(self):
+        return len(self.full)
+
+    def identity_distances(self, embedding):
+        return self.full.identity_distances(embedding)
+
+    def match(self, embeddings, threshold=THRESHOLD):
+        """Return a (name, distance) pair per query, "Unknown" when above threshold"""
+        # One span and one match_queries per face; retries are counted in section_fallbacks
+        with span("match"):
+            matches = self._match(embeddings, threshold)
+        incr("match_queries", len(matches))
+        return matches
+
+    def _match(self, embeddings, threshold):
+        matches = self.roster._match(embeddings, threshold)
+        if not self.fallback or self.full is self.roster:
+            return matches
+        unknown = [i for i, (name, _) in enumerate(matches) if name == "Unknown"]
+        if unknown:
+            incr("section_fallbacks", len(unknown))
+            queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+            for i, retry in zip(unknown, self.full._match(queries[unknown], threshold)):
+                matches[i] = retry
+        return matches
 
 
 def preprocess_face(face):
@@ -16,42 +301,159 @@ def preprocess_face(face):
     return face.astype("uint8")
 
 
+def embed_faces(faces, batch_size=EMBED_BATCH_SIZE, on_batch=None):
+    """Embed preprocessed faces in mini-batches instead of one forward pass per face
+
+    on_batch(done, total) is called before the first and after every batch.
+    """
+    if len(faces) == 0:
+        return np.empty((0, 512), dtype=np.float32)
+
+    batch_size = max(1, int(batch_size))
+    chunks = []
+    if on_batch:
+        on_batch(0, len(faces))
+    for start in range(0, len(faces), batch_size):
+        batch = np.stack(faces[start:start + batch_size])
+        embedder = get_embedder()
+        with _inference_locks["facenet"], span("embed_batch"):
+            chunks.append(np.asarray(embedder.embeddings(batch), dtype=np.float32))
+        incr("faces_embedded", len(batch))
+        if on_batch:
+            on_batch(min(start + batch_size, len(faces)), len(faces))
+    return np.vstack(chunks)
+
+
+def detect_faces(images):
+    """Run YOLO once over a list of images; returns a list of (x1, y1, x2, y2) boxes per image"""
+    if not images:
+        return []
+
+    yolo = get_yolo()
+    with _inference_locks["yolo"], span("detect"):
+        results = yolo(list(images), verbose=False)
+    incr("photos_detected", len(images))
+
+    detections = []
+    for result in results:
+        boxes = []
+        if result.boxes is not None:
+            for box in result.boxes:
+                boxes.append(tuple(map(int, box.xyxy[0])))
+        detections.append(boxes)
+    return detections
+
+
+def crop_faces(img, boxes):
+    """Preprocessed face crops for the boxes with a non-empty region, plus those boxes"""
+    faces = []
+    kept = []
+    with span("crop"):
+        for x1, y1, x2, y2 in boxes:
+            face = img[y1:y2, x1:x2]
+            if face.size == 0:
+                continue
+            faces.append(preprocess_face(face))
+            kept.append((x1, y1, x2, y2))
+    return faces, kept
+
+
+def annotate_face(img, box, name, dist):
+    """Draw the box and "name (distance)" label in place, green if recognized"""
+    x1, y1, x2, y2 = box
+    label = f"{name} ({dist:.2f})"
+    color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
+    cv2.rectangle(img, (x1, y1), (x2, y2), color, 3)
+    cv2.putText(img, label, (x1, y1 - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+
+def load_images(paths, max_workers=DECODE_WORKERS):
+    """Decode image files in parallel; unreadable files come back as None"""
+    if not paths:
+        return []
+    workers = max(1, min(max_workers, len(paths)))
+    with span("decode"), ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(cv2.imread, paths))
+
+
+def extract_embeddings(images, batch_size=EMBED_BATCH_SIZE):
+    """Embed the first detected face of each image using one YOLO call and batched FaceNet
+
+    Returns a list aligned with images holding an embedding, or None where
+    the image is missing or no usable face was found.
+    """
+    valid = [i for i, img in enumerate(images) if img is not None]
+    results = []
+    if valid:
+        yolo = get_yolo()
+        with _inference_locks["yolo"]:
+            results = yolo([images[i] for i in valid], verbose=False)
+
+    faces = []
+    owners = []
+    for i, result in zip(valid, results):
+        if result.boxes is None or len(result.boxes) == 0:
+            continue
+
+        box = result.boxes[0]
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        face = images[i][y1:y2, x1:x2]
+
+        if face.size == 0:
+            continue
+
+        faces.append(preprocess_face(face))
+        owners.append(i)
+
+    embeddings = [None] * len(images)
+    for i, emb in zip(owners, embed_faces(faces, batch_size)):
+        embeddings[i] = emb
+    return embeddings
+
+
 def extract_embedding(img):
-    results = yolo(img, verbose=False)
-    if results[0].boxes is None:
-        return None
+    return extract_embeddings([img])[0]
 
-    box = results[0].boxes[0]
-    x1, y1, x2, y2 = map(int, box.xyxy[0])
-    face = img[y1:y2, x1:x2]
 
-    if face.size == 0:
-        return None
+def select_prototypes(embeddings, method=PROTOTYPE_METHOD, max_prototypes=MAX_PROTOTYPES):
+    """Reduce one student's enrollment embeddings to the rows stored in the gallery
 
-    face = preprocess_face(face)
-    return embedder.embeddings([face])[0]
+    "kmeans" keeps up to max_prototypes cluster centres, "dedup" keeps
+    embeddings that differ from those already kept, "all" keeps every one
+    (capped) and "mean" keeps the single average the app used to store.
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    max_prototypes = max(1, int(max_prototypes))
+    if method == "mean" or len(embeddings) == 1:
+        return embeddings.mean(axis=0, keepdims=True)
+    if method == "all":
+        return embeddings[:max_prototypes]
+    if method == "dedup":
+        kept = [embeddings[0]]
+        for emb in embeddings[1:]:
+            if len(kept) == max_prototypes:
+                break
+            if norm(np.array(kept) - emb, axis=1).min() >= DEDUP_DISTANCE:
+                kept.append(emb)
+        return np.array(kept)
+    if method == "kmeans":
+        return kmeans(embeddings, min(max_prototypes, len(embeddings)))
+    raise ValueError(f"Unknown prototype method: {method}")
 
 
 def recognize_face(embedding, face_db, verbose=False):
-    best_name = "Unknown"
-    best_dist = float("inf")
-    all_distances = {}
-
-    for name, embeddings in face_db.items():
-        min_dist_for_name = float("inf")
-        for db_emb in embeddings:
-            dist = norm(embedding - db_emb)
-            if dist < min_dist_for_name:
-                min_dist_for_name = dist
-            if dist < best_dist:
-                best_dist = dist
-                best_name = name
-        all_distances[name] = min_dist_for_name
-
-    if verbose:
-        print(f"    All distances: {all_distances}")
-        print(f"    Best match: {best_name} with distance {best_dist:.4f}")
-        print(f"    Threshold: {THRESHOLD}")
+    if isinstance(face_db, (FaceGallery, SectionGallery)):
+        gallery = face_db
+    else:
+        gallery = FaceGallery.from_face_db(face_db)
+    best_name, best_dist = gallery.match(embedding)[0]
+
+    # The per-student distance table is only built when DEBUG records are emitted
+    if verbose and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("    All distances: %s", gallery.identity_distances(embedding))
+        logger.debug("    Best match: %s with distance %.4f", best_name, best_dist)
+        logger.debug("    Threshold: %s", THRESHOLD)
 
     if best_dist <= THRESHOLD:
         return best_name, best_dist
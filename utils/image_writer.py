@@ -0,0 +1,144 @@
+# utils/image_writer.py
+import atexit
+import logging
+import os
+import queue
+import threading
+
+import cv2
+
+from utils.metrics import span, incr
+
+IMAGE_FORMAT = "jpg"  # Annotated output format: "jpg", "webp" or "none" to skip writing
+IMAGE_QUALITY = {"jpg": 90, "webp": 80}  # Default encoder quality (0-100) per format
+IMAGE_MAX_SIDE = None  # Downscale outputs so the longer side is at most this many pixels
+WRITER_QUEUE_SIZE = 8  # Images allowed to wait for the writer before submit() blocks
+
+IMAGE_FORMATS = ("jpg", "webp", "none")
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def downscale(image, max_width, max_height=None):
+    """Shrink image (keeping aspect ratio) to fit max_width x max_height; never enlarges"""
+    if max_height is None:
+        max_height = max_width
+    h, w = image.shape[:2]
+    scale = min(max_width / w, max_height / h)
+    if scale >= 1:
+        return image
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+class ImageWriter:
+    """Encodes and writes annotated images on a background thread
+
+    submit() queues the image and returns the path it will be written to, so
+    recognition doesn't wait for the encoder. The image must not be modified
+    after it is submitted. flush() waits for queued writes; close() also stops
+    the thread.
+    """
+
+    def __init__(self, fmt=IMAGE_FORMAT, quality=None, max_side=IMAGE_MAX_SIDE,
+                 queue_size=WRITER_QUEUE_SIZE):
+        fmt = (fmt or "none").lower()
+        if fmt == "jpeg":
+            fmt = "jpg"
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {fmt}")
+        self.fmt = fmt
+        self.quality = IMAGE_QUALITY.get(fmt) if quality is None else int(quality)
+        self.max_side = max_side
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.fmt != "none"
+
+    def encode_params(self):
+        if self.fmt == "webp":
+            return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        return [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+
+    def path_for(self, path):
+        """path with its extension replaced by the configured format's"""
+        return os.path.splitext(path)[0] + "." + self.fmt
+
+    def submit(self, path, image):
+        """Queue image for writing; returns the final path, or None when writing is off"""
+        if not self.enabled:
+            return None
+        path = self.path_for(path)
+        self._start()
+        # A full queue blocks the caller, so a slow disk can't pile up images in memory
+        self._queue.put((path, image))
+        return path
+
+    def write(self, path, image):
+        """Encode and write one image on the calling thread; returns True on success"""
+        with span("image_write"):
+            if self.max_side:
+                image = downscale(image, self.max_side)
+            ok = cv2.imwrite(path, image, self.encode_params())
+        if not ok:
+            raise OSError(f"cv2.imwrite could not write {path}")
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="image-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                path, image = item
+                try:
+                    self.write(path, image)
+                except Exception as e:
+                    self.errors += 1
+                    incr("image_write_errors")
+                    logger.error("Could not write annotated image %s - %s", path, e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every submitted image has been written"""
+        self._queue.join()
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_image_writer():
+    """Process-wide writer with the module defaults, closed (and drained) at exit"""
+    with _shared_lock:
+        writer = _shared.get("writer")
+        if writer is None:
+            writer = _shared["writer"] = ImageWriter()
+            atexit.register(writer.close)
+        return writer
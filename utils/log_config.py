@@ -0,0 +1,26 @@
+# utils/log_config.py
+import logging
+import os
+
+# ATTENDANCE_DIAGNOSTICS=1 turns on DEBUG records (database listing, per-face
+# distances, stage timings) and mirrors them to DIAGNOSTICS_LOG
+DIAGNOSTICS_ENABLED = os.environ.get("ATTENDANCE_DIAGNOSTICS", "0") == "1"
+DIAGNOSTICS_LOG = "attendance_debug.log"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(diagnostics=None):
+    """INFO to the console by default; DEBUG plus the diagnostics log file in diagnostic mode"""
+    if diagnostics is None:
+        diagnostics = DIAGNOSTICS_ENABLED
+    handlers = [logging.StreamHandler()]
+    if diagnostics:
+        handlers.append(logging.FileHandler(DIAGNOSTICS_LOG, mode='w'))
+    logging.basicConfig(level=logging.DEBUG if diagnostics else logging.INFO,
+                        format=LOG_FORMAT, handlers=handlers)
+    return diagnostics
+
+
+def diagnostics_on(logger):
+    """True when `logger` would emit DEBUG records, to skip building expensive ones"""
+    return logger.isEnabledFor(logging.DEBUG)
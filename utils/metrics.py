@@ -0,0 +1,147 @@
+# utils/metrics.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+
+# ATTENDANCE_METRICS=0 turns spans into a shared no-op context manager
+METRICS_ENABLED = os.environ.get("ATTENDANCE_METRICS", "1") != "0"
+METRICS_FILE = "attendance_metrics.json"
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+RECENT_SAMPLES = 1024  # Samples kept per histogram for percentiles
+
+_NO_SPAN = nullcontext()
+
+
+class Histogram:
+    """Duration histogram: fixed millisecond buckets plus recent samples for percentiles"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)  # last bucket is overflow
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        ms = seconds * 1000.0
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.recent.append(ms)
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def summary(self):
+        recent = np.array(self.recent)
+        buckets = {f"<={bound}": n for bound, n in zip(HISTOGRAM_BUCKETS_MS, self.buckets)}
+        buckets["overflow"] = self.buckets[-1]
+        return {
+            "count": self.count,
+            "total_ms": self.total,
+            "mean_ms": self.total / self.count,
+            "min_ms": self.min,
+            "max_ms": self.max,
+            "p50_ms": float(np.percentile(recent, 50)),
+            "p95_ms": float(np.percentile(recent, 95)),
+            "buckets_ms": buckets,
+        }
+
+
+class _Span:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Thread-safe registry of named duration histograms and counters"""
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def span(self, name):
+        """Context manager timing the enclosed block into the `name` histogram"""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def incr(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """Plain-dict copy of every histogram summary and counter"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "spans": {name: h.summary() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def dump(self, path=METRICS_FILE):
+        """Write the snapshot as JSON and return the path"""
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    def format_table(self):
+        """Human-readable summary for the GUI details panel and CLI output"""
+        snapshot = self.snapshot()
+        if not snapshot["enabled"]:
+            return "Timing metrics are disabled (ATTENDANCE_METRICS=0)."
+        if not snapshot["spans"] and not snapshot["counters"]:
+            return "No timings recorded yet."
+        lines = [f"{'stage':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for name, s in snapshot["spans"].items():
+            lines.append(f"{name:<22}{s['count']:>6}{s['p50_ms']:>10.1f}"
+                         f"{s['p95_ms']:>10.1f}{s['max_ms']:>10.1f}")
+        for name, value in snapshot["counters"].items():
+            lines.append(f"{name:<22}{value:>6}")
+        return "\n".join(lines)
+
+
+# Process-wide registry used by the pipeline, GUI and CLI
+metrics = Metrics()
+span = metrics.span
+incr = metrics.incr
+observe = metrics.observe
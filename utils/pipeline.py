@@ -0,0 +1,201 @@
+# utils/pipeline.py
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from utils.face_utils import (
+    detect_faces, preprocess_face, embed_faces, annotate_face, EMBED_BATCH_SIZE
+)
+from utils.metrics import span
+
+PIPELINE_QUEUE_SIZE = 4  # Jobs allowed to wait between two stages (backpressure)
+STAGES = ("decode", "detect", "crop", "embed", "match")
+
+_DONE = object()  # End-of-stream marker passed down the stages
+
+
+class StageStats:
+    """Latency and input-queue depth samples for one stage"""
+
+    def __init__(self, window=1000):
+        self.latencies = deque(maxlen=window)
+        self.depths = deque(maxlen=window)
+        self.count = 0
+        self.max_depth = 0
+
+    def record(self, seconds, depth):
+        self.count += 1
+        self.latencies.append(seconds)
+        self.depths.append(depth)
+        self.max_depth = max(self.max_depth, depth)
+
+    def summary(self):
+        if not self.latencies:
+            return {"count": 0}
+        ms = np.array(self.latencies) * 1000.0
+        return {
+            "count": self.count,
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "max_ms": float(ms.max()),
+            "mean_queue_depth": float(np.mean(self.depths)),
+            "max_queue_depth": self.max_depth,
+        }
+
+
+class RecognitionPipeline:
+    """decode -> detect -> crop -> embed -> match, one thread per stage joined by bounded queues
+
+    While photo N is being embedded, photo N+1 can be in detection and photo
+    N+2 decoding. A full queue blocks the stage before it, so a slow stage
+    throttles the whole pipeline instead of piling up decoded images.
+
+    Jobs are dicts with a "path" or an already decoded "image". Each stage
+    adds keys: image, boxes, face_indexes/crop_boxes/crops, embeddings,
+    matches (list of (face index, box, name, distance)) and present. A job
+    that fails gets an "error" and passes through the remaining stages.
+    """
+
+    def __init__(self, gallery, embed_batch_size=EMBED_BATCH_SIZE,
+                 queue_size=PIPELINE_QUEUE_SIZE, annotate=True, on_stage=None):
+        self.gallery = gallery
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.annotate = annotate
+        # on_stage(job, stage) is called from the stage thread after each stage
+        self.on_stage = on_stage
+        self.stats = {stage: StageStats() for stage in STAGES}
+        self._stop = threading.Event()
+
+    # ---- stages ----
+    def decode(self, job):
+        if job.get("image") is None:
+            with span("decode"):
+                job["image"] = cv2.imread(job["path"])
+        if job["image"] is None:
+            job["error"] = "unreadable image"
+
+    def detect(self, job):
+        job["boxes"] = detect_faces([job["image"]])[0]
+
+    def crop(self, job):
+        indexes, boxes, crops = [], [], []
+        with span("crop"):
+            for face_index, (x1, y1, x2, y2) in enumerate(job["boxes"], start=1):
+                face = job["image"][y1:y2, x1:x2]
+                if face.size == 0:
+                    continue
+                indexes.append(face_index)
+                boxes.append((x1, y1, x2, y2))
+                crops.append(preprocess_face(face))
+        job["face_indexes"], job["crop_boxes"], job["crops"] = indexes, boxes, crops
+
+    def embed(self, job):
+        on_batch = job.get("on_batch")
+        job["embeddings"] = embed_faces(job["crops"], self.embed_batch_size, on_batch=on_batch)
+
+    def match(self, job):
+        matches = self.gallery.match(job["embeddings"]) if len(job["embeddings"]) else []
+        job["matches"] = []
+        job["present"] = set()
+        for face_index, box, (name, dist) in zip(job["face_indexes"], job["crop_boxes"], matches):
+            job["matches"].append((face_index, box, name, dist))
+            if name != "Unknown":
+                job["present"].add(name)
+            if self.annotate:
+                with span("annotate"):
+                    annotate_face(job["image"], box, name, dist)
+
+    # ---- plumbing ----
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run_stage(self, stage, in_q, out_q):
+        func = getattr(self, stage)
+        stats = self.stats[stage]
+        while True:
+            depth = in_q.qsize()
+            job = self._get(in_q)
+            if job is _DONE:
+                self._put(out_q, _DONE)
+                return
+            if "error" not in job:
+                start = time.perf_counter()
+                try:
+                    func(job)
+                except Exception as e:
+                    job["error"] = f"{stage} failed: {e}"
+                seconds = time.perf_counter() - start
+                stats.record(seconds, depth)
+                job.setdefault("timings", {})[stage] = seconds
+                if self.on_stage:
+                    self.on_stage(job, stage)
+            if not self._put(out_q, job):
+                return
+
+    def _feed(self, jobs, out_q, should_stop):
+        for job in jobs:
+            if should_stop and should_stop():
+                break
+            if not self._put(out_q, job):
+                return
+        self._put(out_q, _DONE)
+
+    def run(self, jobs, should_stop=None):
+        """Yield finished jobs in input order; jobs may be a lazy iterable"""
+        self._stop.clear()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(STAGES) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(jobs, queues[0], should_stop),
+                                    name="pipeline-feed", daemon=True)]
+        for i, stage in enumerate(STAGES):
+            threads.append(threading.Thread(target=self._run_stage,
+                                            args=(stage, queues[i], queues[i + 1]),
+                                            name=f"pipeline-{stage}", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                job = self._get(queues[-1])
+                if job is _DONE:
+                    break
+                yield job
+        finally:
+            # Also reached when the caller stops iterating early
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=1.0)
+
+    def stage_stats(self):
+        """Per-stage latency percentiles and queue depth, to spot the bottleneck"""
+        return {stage: self.stats[stage].summary() for stage in STAGES}
+
+    def format_stats(self):
+        lines = []
+        for stage, s in self.stage_stats().items():
+            if not s["count"]:
+                lines.append(f"{stage:>7}: no samples")
+                continue
+            lines.append(f"{stage:>7}: n={s['count']} p50={s['p50_ms']:.1f}ms "
+                         f"p95={s['p95_ms']:.1f}ms queue avg={s['mean_queue_depth']:.1f} "
+                         f"max={s['max_queue_depth']}")
+        return "\n".join(lines)
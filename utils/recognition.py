@@ -0,0 +1,73 @@
+# utils/recognition.py
+import os
+from datetime import date
+
+from utils.face_utils import (
+    load_images, detect_faces, crop_faces, embed_faces, annotate_face,
+    EMBED_BATCH_SIZE
+)
+from utils.image_writer import get_image_writer
+
+
+def output_path_for(img_path, section, output_dir):
+    """Annotated image path: <output_dir>/<date>_<section>_<photo name>.jpg
+
+    The writer swaps the extension for its configured format.
+    """
+    stem = os.path.splitext(os.path.basename(img_path))[0]
+    return os.path.join(output_dir, f"{date.today()}_{section.replace(' ', '_')}_{stem}.jpg")
+
+
+def process_photos(paths, gallery, section, output_dir=None, embed_batch_size=EMBED_BATCH_SIZE,
+                   writer=None):
+    """Detect, embed and match every face in a batch of photos
+
+    One YOLO call covers the whole batch and all faces are embedded and
+    matched together. Returns one dict per path with faces, present (set of
+    names) and output_path, or an error message for unreadable images.
+    Annotated images are handed to writer (the shared background writer by
+    default), so they may still be in flight when this returns.
+    """
+    if output_dir and writer is None:
+        writer = get_image_writer()
+    images = load_images(paths)
+    readable = [i for i, img in enumerate(images) if img is not None]
+    detections = detect_faces([images[i] for i in readable])
+
+    # Gather the faces of every photo so FaceNet and the matcher see one batch
+    faces = []
+    boxes_per_photo = {}
+    for i, boxes in zip(readable, detections):
+        crops, kept = crop_faces(images[i], boxes)
+        faces.extend(crops)
+        boxes_per_photo[i] = (len(boxes), kept)
+
+    embeddings = embed_faces(faces, embed_batch_size)
+    matches = gallery.match(embeddings) if len(embeddings) else []
+
+    results = []
+    match_iter = iter(matches)
+    for i, path in enumerate(paths):
+        if i not in boxes_per_photo:
+            results.append({"path": path, "error": "unreadable image"})
+            continue
+
+        total_faces, kept = boxes_per_photo[i]
+        present = set()
+        for box in kept:
+            name, dist = next(match_iter)
+            if name != "Unknown":
+                present.add(name)
+            annotate_face(images[i], box, name, dist)
+
+        output_path = None
+        if output_dir:
+            output_path = writer.submit(output_path_for(path, section, output_dir), images[i])
+
+        results.append({
+            "path": path,
+            "faces": total_faces,
+            "present": present,
+            "output_path": output_path,
+        })
+    return results
@@ -0,0 +1,138 @@
+# utils/recognition_pool.py
+import multiprocessing
+import os
+import time
+
+from utils.face_utils import EMBED_BATCH_SIZE
+
+CPU_COUNT = os.cpu_count() or 1
+POOL_WORKERS = max(1, CPU_COUNT // 4)  # Each worker holds its own YOLO + FaceNet
+PHOTOS_PER_TASK = 1  # Photos a worker pulls from the queue at a time
+
+# Environment read by the math libraries at import time
+_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+)
+
+# Per-process state set up once by _init_worker
+_worker = {}
+
+
+def limit_threads(threads):
+    """Cap intra-op threads for OpenCV, TensorFlow and torch in this process
+
+    Must run before TensorFlow is initialised, so workers call it first thing.
+    """
+    threads = max(1, int(threads))
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+    import cv2
+    cv2.setNumThreads(threads)
+
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except (ImportError, RuntimeError):
+        # Not installed, or already initialised (env vars above still apply)
+        pass
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _init_worker(threads, store_path, section, output_dir, embed_batch_size, fallback,
+                 image_options):
+    limit_threads(threads)
+
+    from utils.face_utils import load_models
+    from utils.face_store import get_section_gallery
+    from utils.image_writer import ImageWriter
+
+    # Models load once per worker; the gallery maps the same embedding file as every other worker
+    load_models()
+    _worker.update({
+        "gallery": get_section_gallery(section, store_path, fallback),
+        "section": section,
+        "output_dir": output_dir,
+        "embed_batch_size": embed_batch_size,
+        "writer": ImageWriter(**image_options),
+    })
+
+
+def _process_task(paths):
+    from utils.recognition import process_photos
+
+    start = time.perf_counter()
+    results = process_photos(paths, _worker["gallery"], _worker["section"],
+                             _worker["output_dir"], _worker["embed_batch_size"], _worker["writer"])
+    # Encoding overlaps the rest of the task; results only leave once their images exist
+    _worker["writer"].flush()
+    per_photo = (time.perf_counter() - start) / max(len(paths), 1)
+    for result in results:
+        result["seconds"] = per_photo
+        result["worker"] = os.getpid()
+    return results
+
+
+class RecognitionPool:
+    """Process pool that shards photos across workers, each with its own models
+
+    Workers pull PHOTOS_PER_TASK photos at a time from the pool's task queue,
+    so fast workers take more work. Results come back in completion order and
+    the caller marks attendance once for the whole session.
+    """
+
+    def __init__(self, section, workers=POOL_WORKERS, threads_per_worker=None,
+                 output_dir="attendance_images", embed_batch_size=EMBED_BATCH_SIZE,
+                 photos_per_task=PHOTOS_PER_TASK, store_path=None, fallback=True,
+                 image_options=None):
+        from utils.face_store import STORE_DIR
+
+        self.workers = max(1, int(workers))
+        if threads_per_worker is None:
+            threads_per_worker = max(1, CPU_COUNT // self.workers)
+        self.threads_per_worker = threads_per_worker
+        self.photos_per_task = max(1, int(photos_per_task))
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        # spawn: forking a process that already imported TensorFlow can deadlock
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(
+            self.workers, initializer=_init_worker,
+            initargs=(threads_per_worker, store_path or STORE_DIR, section,
+                      output_dir, embed_batch_size, fallback, image_options or {}))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def close(self):
+        """Wait for every submitted photo, then shut the workers down"""
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        """Stop the workers now, dropping photos still queued (errors, Ctrl+C)"""
+        self.pool.terminate()
+        self.pool.join()
+
+    def process(self, paths):
+        """Yield one result dict per photo as workers finish them"""
+        tasks = [paths[i:i + self.photos_per_task]
+                 for i in range(0, len(paths), self.photos_per_task)]
+        for results in self.pool.imap_unordered(_process_task, tasks):
+            yield from results
@@ -0,0 +1,253 @@
+# utils/stream.py
+import logging
+import threading
+import time
+from collections import Counter
+
+import cv2
+
+from utils.face_utils import detect_faces, crop_faces, embed_faces, EMBED_BATCH_SIZE
+from utils.tracking import FaceTracker
+
+STREAM_SAMPLE_FPS = 2.0  # Frames per second sent to recognition
+STREAM_MIN_SIGHTINGS = 3  # Fresh FaceNet matches a student needs to be marked present
+STREAM_REPORT_SECONDS = 5.0  # How often the sustained FPS is logged
+
+logger = logging.getLogger(__name__)
+
+
+def open_source(source):
+    """VideoCapture for a camera index ("0"), a stream URL (rtsp://...) or a video file"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video source: {source}")
+    return cap
+
+
+def is_live(source):
+    """Cameras and network streams run in real time; files can be read at any pace"""
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return True
+    return "://" in str(source)
+
+
+class LatestFrameReader:
+    """Reads a live source on its own thread and keeps only the newest frame
+
+    Recognition takes whatever frame is newest when it is ready for one, so
+    when inference lags the frames in between are dropped instead of queueing
+    up and putting the session further and further behind the camera.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.frames_read = 0
+        self.frames_taken = 0
+        self.finished = False
+        self._frame = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, name="stream-reader", daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        while not self._stop.is_set():
+            ok, frame = self.cap.read()
+            with self._cond:
+                if not ok:
+                    self.finished = True
+                    self._cond.notify_all()
+                    return
+                self.frames_read += 1
+                self._frame = frame
+                self._cond.notify_all()
+
+    def latest(self, timeout=1.0):
+        """Newest unseen frame, or None once the source has ended"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame is not None or self.finished, timeout)
+            frame, self._frame = self._frame, None
+        if frame is not None:
+            self.frames_taken += 1
+        return frame
+
+    @property
+    def frames_dropped(self):
+        return self.frames_read - self.frames_taken
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+
+class StreamSession:
+    """Samples frames from a camera, stream or video file and accumulates who was seen
+
+    Nothing is written while the session runs; run() returns the students
+    matched in at least min_sightings sampled frames (with tracking, only
+    frames where the face was re-embedded count), and the caller marks
+    attendance once for the whole session.
+    """
+
+    def __init__(self, source, gallery, sample_fps=STREAM_SAMPLE_FPS, duration=None,
+                 min_sightings=STREAM_MIN_SIGHTINGS, embed_batch_size=EMBED_BATCH_SIZE,
+                 tracking=True, on_frame=None):
+        self.source = source
+        self.gallery = gallery
+        self.sample_fps = sample_fps
+        self.duration = duration  # Seconds of session (wall clock live, video time for files)
+        self.min_sightings = min_sightings
+        self.embed_batch_size = embed_batch_size
+        # Follow faces across frames and only embed new or due-for-reverify tracks
+        self.tracker = FaceTracker() if tracking else None
+        # on_frame(frame, matches, session) after each sampled frame, e.g. for a preview
+        self.on_frame = on_frame
+        self.sightings = Counter()  # name -> fresh FaceNet matches (not carried-forward track names)
+        self.best_distance = {}
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.faces = 0
+        self.embedded = 0  # FaceNet embeddings computed, to compare against faces
+        self.started = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        """End the session after the current frame"""
+        self._stop.set()
+
+    def recognize_frame(self, frame):
+        """[(box, name, distance)] for every face in one frame"""
+        return self._match_frame(frame)[0]
+
+    def _match_frame(self, frame):
+        """(matches for every face, the subset matched by FaceNet in this frame)"""
+        boxes = detect_faces([frame])[0]
+        if self.tracker is not None:
+            return self._recognize_tracked(frame, boxes)
+        crops, kept = crop_faces(frame, boxes)
+        if not crops:
+            return [], []
+        embeddings = embed_faces(crops, self.embed_batch_size)
+        self.embedded += len(crops)
+        matches = [(box, name, dist) for box, (name, dist) in zip(kept, self.gallery.match(embeddings))]
+        return matches, matches
+
+    def _recognize_tracked(self, frame, boxes):
+        tracks = self.tracker.update(boxes)
+        due = self.tracker.due(tracks)
+        if due:
+            crops, kept = crop_faces(frame, [t.box for t in due])
+            if crops:
+                embeddings = embed_faces(crops, self.embed_batch_size)
+                self.embedded += len(crops)
+                by_box = {t.box: t for t in due}
+                for box, (name, dist) in zip(kept, self.gallery.match(embeddings)):
+                    self.tracker.verify(by_box[box], name, dist)
+        # Tracks that were never embedded (empty crop) are left out until they are
+        matches = [(t.box, t.name, t.dist) for t in tracks if t.verified_at is not None]
+        fresh = [(t.box, t.name, t.dist) for t in tracks
+                 if t.verified_at == self.tracker.frame_index]
+        return matches, fresh
+
+    def _record(self, frame, matches, fresh):
+        self.frames_processed += 1
+        self.faces += len(matches)
+        # Only fresh matches count: a carried-forward track name would turn one
+        # (possibly wrong) match into a sighting on every frame until re-verification
+        for name in {name for _, name, _ in fresh if name != "Unknown"}:
+            self.sightings[name] += 1
+        for _, name, dist in fresh:
+            if name != "Unknown":
+                self.best_distance[name] = min(dist, self.best_distance.get(name, dist))
+        if self.on_frame:
+            self.on_frame(frame, matches, self)
+
+    def _frames_live(self, cap):
+        reader = LatestFrameReader(cap)
+        interval = 1.0 / self.sample_fps
+        start = time.perf_counter()
+        next_due = start
+        try:
+            while not self._stop.is_set():
+                if self.duration and time.perf_counter() - start >= self.duration:
+                    break
+                delay = next_due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                frame = reader.latest()
+                if frame is None:
+                    if reader.finished:
+                        break
+                    continue
+                # Skip missed slots rather than bursting to catch up
+                next_due = max(next_due + interval, time.perf_counter())
+                self.frames_read = reader.frames_read
+                self.frames_dropped = reader.frames_dropped
+                yield frame
+        finally:
+            reader.stop()
+            self.frames_read = reader.frames_read
+            self.frames_dropped = reader.frames_dropped
+
+    def _frames_file(self, cap):
+        # A file never lags behind us, so sample by video time and grab() past the rest
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, int(round(video_fps / self.sample_fps)))
+        max_frames = int(self.duration * video_fps) if self.duration else None
+        index = 0
+        while not self._stop.is_set():
+            if max_frames is not None and index >= max_frames:
+                break
+            if index % step == 0:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self.frames_read += 1
+                yield frame
+            else:
+                if not cap.grab():
+                    break
+                self.frames_read += 1
+                self.frames_dropped += 1
+            index += 1
+
+    def run(self):
+        """Process the source until it ends, duration passes or stop() is called"""
+        cap = open_source(self.source)
+        frames = self._frames_live(cap) if is_live(self.source) else self._frames_file(cap)
+        start = self.started = time.perf_counter()
+        last_report = start
+        try:
+            for frame in frames:
+                self._record(frame, *self._match_frame(frame))
+                now = time.perf_counter()
+                if now - last_report >= STREAM_REPORT_SECONDS:
+                    logger.info("%d frames processed, %.2f fps, %d dropped, %d present so far",
+                                self.frames_processed, self.frames_processed / (now - start),
+                                self.frames_dropped, len(self.present()))
+                    last_report = now
+        finally:
+            frames.close()
+            cap.release()
+        return self.summary()
+
+    def present(self):
+        return {name for name, count in self.sightings.items() if count >= self.min_sightings}
+
+    def summary(self):
+        seconds = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            "present": self.present(),
+            "sightings": dict(self.sightings),
+            "best_distance": dict(self.best_distance),
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "faces": self.faces,
+            "embedded": self.embedded,
+            "seconds": seconds,
+            "fps": self.frames_processed / seconds if seconds > 0 else 0.0,
+        }
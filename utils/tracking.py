@@ -0,0 +1,135 @@
+# utils/tracking.py
+import numpy as np
+
+from utils.face_utils import THRESHOLD
+
+TRACK_IOU_THRESHOLD = 0.3  # Minimum overlap to continue a track from the previous frame
+TRACK_CENTROID_RATIO = 0.5  # Else: centroid moved less than this fraction of the box diagonal
+TRACK_MAX_MISSED = 5  # Frames a track survives without a matching box
+TRACK_REVERIFY_FRAMES = 30  # Frames between re-embedding a confidently matched track
+TRACK_UNCERTAIN_FRAMES = 5  # ... for Unknown tracks or matches close to the threshold
+TRACK_CONFIDENT_DISTANCE = 0.85 * THRESHOLD  # Matches closer than this count as confident
+
+
+def box_iou(a, b):
+    """Pairwise IoU between two arrays of (x1, y1, x2, y2) boxes"""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+    """One face followed across frames, with the identity from its last embedding"""
+
+    def __init__(self, track_id, box, frame_index):
+        self.id = track_id
+        self.box = box
+        self.name = "Unknown"
+        self.dist = float("inf")
+        self.verified_at = None  # Frame index of the last embedding, None until embedded
+        self.last_seen = frame_index
+        self.hits = 1
+
+    @property
+    def confident(self):
+        return self.name != "Unknown" and self.dist < TRACK_CONFIDENT_DISTANCE
+
+    def needs_embedding(self, frame_index):
+        if self.verified_at is None:
+            return True
+        every = TRACK_REVERIFY_FRAMES if self.confident else TRACK_UNCERTAIN_FRAMES
+        return frame_index - self.verified_at >= every
+
+
+class FaceTracker:
+    """Greedy IoU tracker with a centroid fallback, layered on per-frame YOLO boxes
+
+    Students barely move during a class, so a face only needs to be embedded
+    when its track starts and then every TRACK_REVERIFY_FRAMES frames (sooner
+    while the match is uncertain); in between the identity is carried forward.
+    """
+
+    def __init__(self):
+        self.tracks = {}
+        self.frame_index = -1
+        self._next_id = 1
+
+    def _associate(self, tracks, boxes):
+        """Pairs of (track, box index), highest IoU first, then nearest centroid"""
+        if not tracks or not boxes:
+            return []
+        iou = box_iou([t.box for t in tracks], boxes)
+        pairs = []
+        used_tracks, used_boxes = set(), set()
+        for ti, bi in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[ti, bi] < TRACK_IOU_THRESHOLD:
+                break
+            if ti in used_tracks or bi in used_boxes:
+                continue
+            used_tracks.add(ti)
+            used_boxes.add(bi)
+            pairs.append((tracks[ti], bi))
+
+        # Small or fast-moving faces can lose all overlap; fall back to centroid distance
+        left_tracks = [i for i in range(len(tracks)) if i not in used_tracks]
+        left_boxes = [i for i in range(len(boxes)) if i not in used_boxes]
+        if left_tracks and left_boxes:
+            a = np.array([tracks[i].box for i in left_tracks], dtype=np.float32)
+            b = np.array([boxes[i] for i in left_boxes], dtype=np.float32)
+            ca = (a[:, :2] + a[:, 2:]) / 2
+            cb = (b[:, :2] + b[:, 2:]) / 2
+            dist = np.linalg.norm(ca[:, None] - cb[None, :], axis=2)
+            limit = TRACK_CENTROID_RATIO * np.linalg.norm(a[:, 2:] - a[:, :2], axis=1)
+            for ti, bi in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+                if dist[ti, bi] > limit[ti]:
+                    continue
+                track_i, box_i = left_tracks[ti], left_boxes[bi]
+                if track_i in used_tracks or box_i in used_boxes:
+                    continue
+                used_tracks.add(track_i)
+                used_boxes.add(box_i)
+                pairs.append((tracks[track_i], box_i))
+        return pairs
+
+    def update(self, boxes):
+        """Advance one frame; returns the tracks for this frame's boxes, in box order"""
+        self.frame_index += 1
+        boxes = [tuple(box) for box in boxes]
+        tracks = list(self.tracks.values())
+
+        assigned = [None] * len(boxes)
+        for track, bi in self._associate(tracks, boxes):
+            track.box = boxes[bi]
+            track.last_seen = self.frame_index
+            track.hits += 1
+            assigned[bi] = track
+
+        for bi, box in enumerate(boxes):
+            if assigned[bi] is None:
+                track = Track(self._next_id, box, self.frame_index)
+                self._next_id += 1
+                self.tracks[track.id] = track
+                assigned[bi] = track
+
+        for track_id in [tid for tid, t in self.tracks.items()
+                         if self.frame_index - t.last_seen > TRACK_MAX_MISSED]:
+            del self.tracks[track_id]
+        return assigned
+
+    def due(self, tracks):
+        """The subset of tracks that should be (re-)embedded this frame"""
+        return [t for t in tracks if t.needs_embedding(self.frame_index)]
+
+    def verify(self, track, name, dist):
+        """Record a fresh match for a track"""
+        track.name = name
+        track.dist = float(dist)
+        track.verified_at = self.frame_index